@@ -0,0 +1,81 @@
+from django.db.models import Case, Count, IntegerField, Q, Value, When
+from .models import Customer, normalize_email, normalize_name, normalize_phone
+
+# Normalized fields that identify a customer, a shared value is a duplicate.
+# The name is not one of them, different people often share a name
+BLOCKING_KEYS = ("normalized_email", "normalized_phone")
+
+
+def find_duplicates(attributes, exclude_id=None):
+    """
+    Args:
+        attributes: The customer fields posted by the add or update form
+        exclude_id: ID of the customer being updated, not its own duplicate
+
+    Returns the customers with the same email or phone, once normalized,
+    those with the same name first. A customer without either has no
+    duplicates. Every key is indexed, so the check does not scan the
+    customers.
+    """
+    condition = Q()
+    email = normalize_email(attributes.get("email"))
+    if email:
+        condition |= Q(normalized_email=email)
+    phone = normalize_phone(attributes.get("phone"))
+    if phone:
+        condition |= Q(normalized_phone=phone)
+    if not condition:
+        return Customer.objects.none()
+
+    customers = Customer.objects.filter(condition)
+    if exclude_id is not None:
+        customers = customers.exclude(id=exclude_id)
+    # The name only breaks the tie between customers sharing an email or phone
+    name = normalize_name(attributes.get("first_name"), attributes.get("last_name"))
+    return customers.annotate(other_name=Case(
+        When(search_name=name, then=Value(0)), default=Value(1), output_field=IntegerField(),
+    )).order_by("other_name", "id")
+
+
+def duplicate_clusters(keys=BLOCKING_KEYS):
+    """
+    Args:
+        keys: Normalized fields used as blocking keys
+
+    Returns the groups of customer IDs that are duplicates of each other,
+    each one sorted, biggest groups first.
+
+    Customers are only compared within a block, the customers sharing the
+    value of a key, which the database groups with its index. Blocks of
+    different keys sharing a customer are merged, so A and B with the same
+    phone and B and C with the same email make one cluster.
+    """
+    parent = {}
+
+    def find(customer_id):
+        root = parent.setdefault(customer_id, customer_id)
+        while root != parent[root]:
+            root = parent[root]
+        # Point the whole path at the root so the next lookups are direct
+        while customer_id != root:
+            parent[customer_id], customer_id = root, parent[customer_id]
+        return root
+
+    for key in keys:
+        shared = Customer.objects.exclude(**{key + "__isnull": True}).exclude(
+            **{key: ""}).values(key).annotate(total=Count("id")).filter(
+            total__gt=1).values(key)
+        block_ids = {}
+        for customer_id, value in Customer.objects.filter(
+                **{key + "__in": shared}).values_list("id", key).iterator():
+            block_ids.setdefault(value, []).append(customer_id)
+        for ids in block_ids.values():
+            root = find(ids[0])
+            for customer_id in ids[1:]:
+                parent[find(customer_id)] = root
+
+    clusters = {}
+    for customer_id in parent:
+        clusters.setdefault(find(customer_id), []).append(customer_id)
+    return sorted((sorted(ids) for ids in clusters.values()),
+                  key=lambda ids: (-len(ids), ids[0]))
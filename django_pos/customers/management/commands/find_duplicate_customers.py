@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from customers.dedup import BLOCKING_KEYS, duplicate_clusters
+from customers.models import Customer
+
+
+class Command(BaseCommand):
+    help = "Lists the clusters of customers sharing an email or a phone"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--key", action="append", choices=BLOCKING_KEYS,
+                            help="Blocking key to compare, every key by default")
+
+    def handle(self, *args, **options):
+        clusters = duplicate_clusters(options["key"] or BLOCKING_KEYS)
+        if not clusters:
+            self.stdout.write(self.style.SUCCESS("No duplicate customers found"))
+            return
+
+        customers = Customer.objects.in_bulk([customer_id for ids in clusters for customer_id in ids])
+        for ids in clusters:
+            self.stdout.write("Cluster of " + str(len(ids)) + " customers:")
+            for customer_id in ids:
+                customer = customers[customer_id]
+                self.stdout.write("  " + str(customer.id) + " | " + customer.get_full_name() +
+                                  " | " + str(customer.email) + " | " + str(customer.phone))
+        self.stdout.write(self.style.WARNING(
+            "Found " + str(len(clusters)) + " clusters of duplicate customers"))
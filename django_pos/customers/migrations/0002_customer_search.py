@@ -0,0 +1,67 @@
+# Generated by Django 4.1.5 on 2026-10-18 07:18
+
+import re
+
+from django.db import migrations, models
+
+NON_DIGITS = re.compile(r"\D")
+
+
+# Copies of the customers.models normalizers as they were when this migration
+# was written, so later changes to them do not change what it does
+
+def normalize_name(*names):
+    return " ".join(" ".join(name.split()) for name in names if name).casefold()
+
+
+def normalize_phone(phone):
+    return NON_DIGITS.sub("", phone or "") or None
+
+
+def normalize_email(email):
+    return (email or "").strip().lower() or None
+
+
+def backfill_search_fields(apps, schema_editor):
+    Customer = apps.get_model('customers', 'Customer')
+    customers = []
+    for customer in Customer.objects.iterator(chunk_size=1000):
+        customer.search_name = normalize_name(customer.first_name, customer.last_name)
+        customer.search_last_name = normalize_name(customer.last_name)
+        customer.normalized_phone = normalize_phone(customer.phone)
+        customer.normalized_email = normalize_email(customer.email)
+        customers.append(customer)
+    Customer.objects.bulk_update(
+        customers, ['search_name', 'search_last_name', 'normalized_phone', 'normalized_email'],
+        batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='normalized_email',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=256, null=True),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='normalized_phone',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=30, null=True),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='search_last_name',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=256),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='search_name',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=513),
+        ),
+        migrations.RunPython(backfill_search_fields, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.1.5 on 2026-10-18 07:31
+
+import re
+
+from django.conf import settings
+from django.db import migrations
+
+NON_DIGITS = re.compile(r"\D")
+
+
+def normalize_phone(phone):
+    # Copy of customers.models.normalize_phone as it was when this migration
+    # was written, so later changes to it do not change what it does
+    digits = NON_DIGITS.sub("", phone or "")
+    if digits.startswith("00"):
+        digits = digits[2:]
+    elif digits.startswith("0") and getattr(settings, "CUSTOMER_PHONE_COUNTRY_CODE", None):
+        digits = settings.CUSTOMER_PHONE_COUNTRY_CODE + digits[1:]
+    return digits or None
+
+
+def renormalize_phones(apps, schema_editor):
+    Customer = apps.get_model('customers', 'Customer')
+    customers = []
+    for customer in Customer.objects.exclude(phone=None).iterator(chunk_size=1000):
+        customer.normalized_phone = normalize_phone(customer.phone)
+        customers.append(customer)
+    Customer.objects.bulk_update(customers, ['normalized_phone'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0002_customer_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(renormalize_phones, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,38 @@
+import re
+
+from django.conf import settings
 from django.db import models
 
+NON_DIGITS = re.compile(r"\D")
+
+
+def normalize_name(*names):
+    """
+    Returns the names joined and case folded the way the search compares them.
+    """
+    return " ".join(" ".join(name.split()) for name in names if name).casefold()
+
+
+def normalize_phone(phone):
+    """
+    Returns the digits of the phone number in international form, without
+    the 00 prefix and with the country code instead of a leading 0. None when
+    it has no digits.
+    """
+    digits = NON_DIGITS.sub("", phone or "")
+    if digits.startswith("00"):
+        digits = digits[2:]
+    elif digits.startswith("0") and settings.CUSTOMER_PHONE_COUNTRY_CODE:
+        digits = settings.CUSTOMER_PHONE_COUNTRY_CODE + digits[1:]
+    return digits or None
+
+
+def normalize_email(email):
+    """
+    Returns the email address trimmed and lower cased, None when blank.
+    """
+    return (email or "").strip().lower() or None
+
 
 class Customer(models.Model):
     first_name = models.CharField(max_length=256)
@@ -7,19 +40,38 @@ class Customer(models.Model):
     address = models.TextField(max_length=256, blank=True, null=True)
     email = models.EmailField(max_length=256, blank=True, null=True)
     phone = models.CharField(max_length=30, blank=True, null=True)
+    # Normalized copies kept by save(), indexed for the prefix search and the
+    # duplicate detection
+    search_name = models.CharField(max_length=513, db_index=True, editable=False, default="")
+    search_last_name = models.CharField(max_length=256, db_index=True, editable=False, default="")
+    normalized_phone = models.CharField(
+        max_length=30, db_index=True, editable=False, blank=True, null=True)
+    normalized_email = models.CharField(
+        max_length=256, db_index=True, editable=False, blank=True, null=True)
 
     class Meta:
         db_table = 'Customers'
 
     def __str__(self) -> str:
-        return self.first_name + " " + self.last_name
+        return self.get_full_name()
+
+    def save(self, *args, **kwargs):
+        self.normalize()
+        super().save(*args, **kwargs)
+
+    def normalize(self):
+        self.search_name = normalize_name(self.first_name, self.last_name)
+        self.search_last_name = normalize_name(self.last_name)
+        self.normalized_phone = normalize_phone(self.phone)
+        self.normalized_email = normalize_email(self.email)
 
     def get_full_name(self):
-        return self.first_name + " " + self.last_name
+        # The last name is optional
+        return (self.first_name + " " + (self.last_name or "")).strip()
 
     def to_select2(self):
         item = {
-            "label": self.get_full_name(),
-            "value": self.id
+            "id": self.id,
+            "text": self.get_full_name(),
         }
         return item
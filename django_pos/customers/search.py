@@ -0,0 +1,45 @@
+from django.db.models import Q
+from .models import NON_DIGITS, Customer, normalize_email, normalize_name, normalize_phone
+
+# Customers returned per page of the sale page autocomplete
+CUSTOMERS_PAGE_SIZE = 20
+# Shortest run of digits searched in the phone numbers
+PHONE_MIN_DIGITS = 3
+# Sorts after any character, so [prefix, prefix + END) holds every completion
+PREFIX_END = "\U0010ffff"
+
+
+def prefix_range(field, prefix):
+    """
+    Returns the condition matching the values of the field starting with the
+    prefix, written as a range so the field's index is searched.
+    """
+    return Q(**{field + "__gte": prefix, field + "__lt": prefix + PREFIX_END})
+
+
+def search_customers(term, page=1):
+    """
+    Args:
+        term: Text typed in the customer autocomplete
+        page: Page of the results, starting from 1
+
+    Returns a (customers, more) tuple: one page of the customers whose full
+    name, last name, phone or email starts with the term, sorted by name, and
+    whether there are more pages.
+    """
+    customers = Customer.objects.all()
+    name = normalize_name(term)
+    if name:
+        condition = prefix_range("search_name", name) | prefix_range("search_last_name", name)
+        if len(NON_DIGITS.sub("", term)) >= PHONE_MIN_DIGITS:
+            condition |= prefix_range("normalized_phone", normalize_phone(term))
+        email = normalize_email(term)
+        if email:
+            condition |= prefix_range("normalized_email", email)
+        customers = customers.filter(condition)
+
+    offset = (page - 1) * CUSTOMERS_PAGE_SIZE
+    # One extra row tells whether a next page exists without counting
+    rows = list(customers.only("id", "first_name", "last_name").order_by(
+        "search_name", "id")[offset:offset + CUSTOMERS_PAGE_SIZE + 1])
+    return rows[:CUSTOMERS_PAGE_SIZE], len(rows) > CUSTOMERS_PAGE_SIZE
@@ -1,3 +1,67 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.test import override_settings
+from pos.testing import POSTestCase
+from .dedup import duplicate_clusters, find_duplicates
+from .models import Customer, normalize_phone
 
-# Create your tests here.
+
+@override_settings(CUSTOMER_PHONE_COUNTRY_CODE="254")
+class DuplicateCustomerTests(POSTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ann = Customer.objects.create(
+            first_name="Ann", last_name="Lee", email="Ann@Example.com", phone="0712 345 678")
+
+    def customer(self, first_name, last_name="", email="", phone=""):
+        return {"first_name": first_name, "last_name": last_name, "address": "",
+                "email": email, "phone": phone}
+
+    def test_phone_numbers_are_compared_in_international_form(self):
+        for phone in ("0712345678", "+254 712 345 678", "00254-712-345-678"):
+            self.assertEqual(normalize_phone(phone), "254712345678")
+        self.assertIsNone(normalize_phone(" - "))
+
+    def test_same_email_or_phone_is_a_duplicate(self):
+        self.assertEqual(list(find_duplicates(self.customer("A.", email=" ann@example.COM "))),
+                         [self.ann])
+        self.assertEqual(list(find_duplicates(self.customer("Someone", phone="+254712345678"))),
+                         [self.ann])
+        self.assertEqual(list(find_duplicates(
+            self.customer("Ann", "Lee", email="ann@example.com"), exclude_id=self.ann.id)), [])
+
+    def test_same_name_is_not_a_duplicate(self):
+        self.assertFalse(find_duplicates(self.customer("ann", "LEE")).exists())
+        self.assertFalse(find_duplicates(self.customer("Ann", "Lee", phone="0799000000")).exists())
+
+    def test_same_name_breaks_the_tie(self):
+        other = Customer.objects.create(first_name="Bob", last_name="Lee", email="bob@example.com")
+        found = find_duplicates(self.customer(
+            "Ann", "Lee", email="bob@example.com", phone="0712345678"))
+        self.assertEqual(list(found), [self.ann, other])
+        found = find_duplicates(self.customer(
+            "Bob", "Lee", email="bob@example.com", phone="0712345678"))
+        self.assertEqual(list(found), [other, self.ann])
+
+    def test_clusters_join_shared_emails_and_phones(self):
+        same_phone = Customer.objects.create(
+            first_name="A.", last_name="Lee", phone="+254712345678", email="lee@example.com")
+        same_email = Customer.objects.create(first_name="Annie", email="LEE@example.com")
+        Customer.objects.create(first_name="Ann", last_name="Lee")
+        Customer.objects.create(first_name="Ann", last_name="Lee", phone="0700111222")
+
+        self.assertEqual(duplicate_clusters(), [[self.ann.id, same_phone.id, same_email.id]])
+        self.assertEqual(duplicate_clusters(["normalized_email"]),
+                         [[same_phone.id, same_email.id]])
+
+    def test_add_view(self):
+        self.client.force_login(User.objects.create_user("manager", password="secret"))
+
+        response = self.client.post("/customers/add", self.customer("Annie", phone="+254712345678"))
+        self.assertRedirects(response, "/customers/add", fetch_redirect_response=False)
+        self.assertEqual(Customer.objects.count(), 1)
+
+        # Another person with the same name
+        response = self.client.post("/customers/add", self.customer("Ann", "Lee"))
+        self.assertRedirects(response, "/customers/", fetch_redirect_response=False)
+        self.assertEqual(Customer.objects.filter(search_name="ann lee").count(), 2)
@@ -6,6 +6,8 @@ app_name = "customers"
 urlpatterns = [
     # List customers
     path('', views.customers_list_view, name='customers_list'),
+    # Search customers, used by the sale page autocomplete
+    path('search', views.customers_search_view, name='customers_search'),
     # Add customer
     path('add', views.customers_add_view, name='customers_add'),
     # Update customer
@@ -1,7 +1,11 @@
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
 from django.shortcuts import render, redirect
+from django.views.decorators.http import require_GET
+from .dedup import find_duplicates
 from .models import Customer
+from .search import search_customers
 
 
 @login_required(login_url="/accounts/login/")
@@ -13,6 +17,28 @@ def customers_list_view(request):
     return render(request, "customers/customers.html", context=context)
 
 
+@login_required(login_url="/accounts/login/")
+@require_GET
+def customers_search_view(request):
+    """
+    Args:
+        request: GET sent by the select2 autocomplete with "term" and "page"
+    Returns one page of the matching customers in the select2 format.
+    """
+    try:
+        page = int(request.GET.get("page") or 1)
+        if page < 1:
+            raise ValueError("Invalid page: " + str(page))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    customers, more = search_customers(request.GET.get("term", ""), page)
+    return JsonResponse({
+        "results": [customer.to_select2() for customer in customers],
+        "pagination": {"more": more},
+    })
+
+
 @login_required(login_url="/accounts/login/")
 def customers_add_view(request):
     context = {
@@ -31,9 +57,10 @@ def customers_add_view(request):
             "phone": data['phone'],
         }
 
-        # Check if a customer with the same attributes exists
-        if Customer.objects.filter(**attributes).exists():
-            messages.error(request, 'Customer already exists!',
+        # Check if a customer with the same email or phone exists
+        duplicate = find_duplicates(attributes).first()
+        if duplicate is not None:
+            messages.error(request, 'Customer already exists: ' + duplicate.get_full_name() + '!',
                            extra_tags="warning")
             return redirect('customers:customers_add')
 
@@ -92,13 +119,16 @@ def customers_update_view(request, customer_id):
                 "phone": data['phone'],
             }
 
-            # Check if a customer with the same attributes exists
-            if Customer.objects.filter(**attributes).exists():
-                messages.error(request, 'Customer already exists!',
+            # Check if another customer with the same email or phone exists
+            duplicate = find_duplicates(attributes, exclude_id=customer.id).first()
+            if duplicate is not None:
+                messages.error(request, 'Customer already exists: ' + duplicate.get_full_name() + '!',
                                extra_tags="warning")
-                return redirect('customers:customers_add')
+                return redirect('customers:customers_update', customer_id=customer.id)
 
-            customer = Customer.objects.get(id=customer_id)
+            for field, value in attributes.items():
+                setattr(customer, field, value)
+            customer.save()
 
             messages.success(request, '¡Customer: ' + customer.get_full_name() +
                              ' updated successfully!', extra_tags="success")
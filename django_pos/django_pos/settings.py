@@ -99,6 +99,17 @@ DATABASES = {
 }
 
 
+# Cache
+# Shared by every worker process, so a version bumped by one is seen by all
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.path.join(CORE_DIR, "cache"),
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
@@ -143,6 +154,26 @@ STATICFILES_DIRS = (
 )
 STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 
+# Sale receipts
+# PDFs are rendered in the background when a sale is created and cached here
+RECEIPT_CACHE_DIR = os.path.join(CORE_DIR, 'receipts')
+RECEIPT_RENDER_WORKERS = 2
+
+# Products
+# Scanned barcodes kept in memory by each worker
+BARCODE_CACHE_SIZE = 10000
+
+# Customers
+# Country code given to local phone numbers written with a leading 0, so both
+# ways of writing a number are detected as the same customer
+CUSTOMER_PHONE_COUNTRY_CODE = "254"
+
+# Dashboard
+# Threads computing the dashboard widgets at the same time
+DASHBOARD_WIDGET_WORKERS = 5
+# Seconds the dashboard page waits for its widgets, slower ones load afterwards
+DASHBOARD_WIDGET_WAIT = 0.5
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
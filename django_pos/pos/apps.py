@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class PosConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "pos"
+
+    def ready(self):
+        # Invalidate the cached dashboard when its data changes
+        from . import signals  # noqa: F401
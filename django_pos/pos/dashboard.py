@@ -0,0 +1,343 @@
+import json
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count, F, FloatField, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+from products.models import Product, Category
+from sales.leaderboard import top_sellers
+from sales.models import DailySalesSummary
+from sales.summary import (SUMMARY_FIELDS, details_in_period, local_period,
+                           sales_in_period)
+
+DASHBOARD_VERSION_KEY = "dashboard:version"
+# Cached contexts are only read while their version is current, this just
+# keeps stale ones from piling up
+DASHBOARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Widgets run in these threads, so a page waits for the slowest one only
+_executor = ThreadPoolExecutor(
+    max_workers=settings.DASHBOARD_WIDGET_WORKERS,
+    thread_name_prefix="dashboard",
+)
+# Widgets being computed, by cache key
+_pending = {}
+_pending_lock = threading.Lock()
+
+METRICS_GRANULARITIES = ("hour", "day", "week", "month")
+# Hourly figures come from the sales themselves, so their range is limited
+METRICS_MAX_HOURLY_DAYS = 31
+
+
+def _profit_and_units(today, field):
+    week_start = today - timedelta(days=today.weekday())
+    month_start = today.replace(day=1)
+    days = DailySalesSummary.objects.filter(
+        date__gte=min(week_start, month_start), date__lte=today
+    ).values_list("date", field)
+
+    daily = weekly = monthly = 0
+    for date, value in days:
+        if date == today:
+            daily += value
+        if date >= week_start:
+            weekly += value
+        if date >= month_start:
+            monthly += value
+    return daily, weekly, monthly
+
+
+def profit_widget(today):
+    daily, weekly, monthly = _profit_and_units(today, "profit")
+    return {
+        "daily_profit": daily,
+        "weekly_profit": weekly,
+        "monthly_profit": monthly,
+    }
+
+
+def units_widget(today):
+    daily, weekly, monthly = _profit_and_units(today, "units")
+    return {
+        "daily_products_sold": daily,
+        "weekly_products_sold": weekly,
+        "monthly_products_sold": monthly,
+    }
+
+
+def earnings_widget(today):
+    # At most one small row per day of the year, instead of every sale
+    days = DailySalesSummary.objects.filter(
+        date__gte=today.replace(month=1, day=1), date__lte=today
+    ).values_list("date", "revenue")
+
+    # Calculate earnings per month
+    monthly_earnings = [0.0] * 12
+    for date, revenue in days:
+        monthly_earnings[date.month - 1] += revenue
+
+    return {
+        # Calculate annual earnings
+        "annual_earnings": format(sum(monthly_earnings), '.2f'),
+        "monthly_earnings": json.dumps(monthly_earnings),
+        # AVG per month
+        "avg_month": format(sum(monthly_earnings) / 12, '.2f'),
+    }
+
+
+def top_products_widget(today):
+    # Top-selling products, from the leaderboard instead of every sale detail
+    top_products = top_sellers("all", limit=3)
+
+    top_products_names = []
+    top_products_quantity = []
+
+    for p in top_products:
+        top_products_names.append(p["name"])
+        top_products_quantity.append(p["quantity"])
+
+    return {
+        "top_products_names": json.dumps(top_products_names),
+        "top_products_names_list": top_products_names,
+        "top_products_quantity": json.dumps(top_products_quantity),
+    }
+
+
+def counts_widget(today):
+    return {
+        "products": Product.objects.all().count(),
+        "categories": Category.objects.all().count(),
+    }
+
+
+# Independent parts of the dashboard, each one computed with its own queries
+DASHBOARD_WIDGETS = {
+    "profit": profit_widget,
+    "units": units_widget,
+    "earnings": earnings_widget,
+    "top_products": top_products_widget,
+    "counts": counts_widget,
+}
+
+
+def _run_widget(name, today):
+    try:
+        return DASHBOARD_WIDGETS[name](today)
+    finally:
+        # Each worker thread has its own database connection
+        connection.close()
+
+
+def dashboard_context(parallel=True):
+    """
+    Computes every figure shown on the dashboard.
+
+    Args:
+        parallel: Run the widgets at the same time in the worker threads, so
+            the time taken is the one of the slowest widget
+    """
+    today = timezone.localdate()
+    context = {}
+    if parallel:
+        futures = [_executor.submit(_run_widget, name, today)
+                   for name in DASHBOARD_WIDGETS]
+        for future in futures:
+            context.update(future.result())
+    else:
+        for widget in DASHBOARD_WIDGETS.values():
+            context.update(widget(today))
+    return context
+
+
+def bump_dashboard_version():
+    """
+    Invalidates every cached dashboard. Called when a sale is created or a
+    product or category changes.
+    """
+    # A fresh random version, two workers bumping at once can not collide.
+    # The time it changed is kept with it for the Last-Modified of the metrics
+    state = {"version": uuid.uuid4().hex, "modified": timezone.now()}
+    cache.set(DASHBOARD_VERSION_KEY, state, timeout=None)
+    return state
+
+
+def _dashboard_state():
+    state = cache.get(DASHBOARD_VERSION_KEY)
+    if state is None:
+        state = bump_dashboard_version()
+    return state
+
+
+def dashboard_version():
+    return _dashboard_state()["version"]
+
+
+def dashboard_modified():
+    """
+    Returns when the dashboard data last changed, or when the version was
+    lost from the cache, whichever is later.
+    """
+    return _dashboard_state()["modified"]
+
+
+def _widget_key(name, today):
+    # The date is part of the key, daily figures start over at midnight
+    return "dashboard:widget:" + name + ":" + dashboard_version() + ":" + str(today)
+
+
+def _compute_widget(name, today, key):
+    context = _run_widget(name, today)
+    cache.set(key, context, DASHBOARD_CACHE_TIMEOUT)
+    return context
+
+
+def _forget(key):
+    with _pending_lock:
+        _pending.pop(key, None)
+
+
+def _schedule_widget(name, today, key):
+    with _pending_lock:
+        future = _pending.get(key)
+        if future is not None:
+            return future
+        future = _executor.submit(_compute_widget, name, today, key)
+        _pending[key] = future
+    future.add_done_callback(lambda done: _forget(key))
+    return future
+
+
+def widget_context(name):
+    """
+    Args:
+        name: One of DASHBOARD_WIDGETS
+
+    Returns the context of the widget, from the cache while nothing changed
+    since it was computed. A widget already being computed is waited for.
+    """
+    today = timezone.localdate()
+    key = _widget_key(name, today)
+    context = cache.get(key)
+    if context is None:
+        context = _schedule_widget(name, today, key).result()
+    return context
+
+
+def cached_dashboard_context(timeout=None):
+    """
+    Returns the dashboard context and the names of the widgets missing from it.
+
+    Cached widgets cost no queries at all. The others are computed at the same
+    time in the worker threads; those not done after timeout seconds keep
+    running and are left for the page to load with widget_context.
+
+    Args:
+        timeout: Seconds to wait for the missing widgets, None waits for all
+    """
+    today = timezone.localdate()
+    keys = {name: _widget_key(name, today) for name in DASHBOARD_WIDGETS}
+    cached = cache.get_many(list(keys.values()))
+
+    context = {}
+    futures = {}
+    for name, key in keys.items():
+        if key in cached:
+            context.update(cached[key])
+        else:
+            futures[_schedule_widget(name, today, key)] = name
+
+    done, _ = wait(futures, timeout=timeout)
+    pending = []
+    for future, name in futures.items():
+        if future in done:
+            context.update(future.result())
+        else:
+            pending.append(name)
+    return context, pending
+
+
+def _day_bucket(day, granularity):
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+
+def _hourly_series(first_day, last_day):
+    start, end = local_period(first_day, last_day)
+    tz = timezone.get_current_timezone()
+    buckets = {}
+
+    sales = sales_in_period(start, end).annotate(
+        period=TruncHour("date_added", tzinfo=tz)
+    ).values("period").annotate(
+        revenue=Sum("grand_total"),
+        payed=Sum("amount_payed"),
+        sale_count=Count("id"),
+    ).order_by()
+    for row in sales:
+        buckets[row["period"]] = {
+            "revenue": row["revenue"] or 0,
+            "cost": 0,
+            "profit": row["payed"] or 0,
+            "units": 0,
+            "sale_count": row["sale_count"],
+        }
+
+    details = details_in_period(start, end).annotate(
+        period=TruncHour("sale__date_added", tzinfo=tz)
+    ).values("period").annotate(
+        units=Sum("quantity"),
+        cost=Sum(F("quantity") * F("unit_cost"), output_field=FloatField()),
+    ).order_by()
+    for row in details:
+        bucket = buckets[row["period"]]
+        bucket["units"] = row["units"] or 0
+        bucket["cost"] = row["cost"] or 0
+        bucket["profit"] -= bucket["cost"]
+    return buckets
+
+
+def metrics_series(first_day, last_day, granularity):
+    """
+    Computes the sales figures of the days between first_day and last_day,
+    both included, grouped by hour, day, week or month.
+
+    Days, weeks and months are added up from the daily summary. Hours are
+    aggregated from the sales, so that range is limited to
+    METRICS_MAX_HOURLY_DAYS.
+
+    Returns {"series": [...], "totals": {...}} with one entry per period
+    that had sales.
+    """
+    if granularity not in METRICS_GRANULARITIES:
+        raise ValueError("Invalid granularity: " + str(granularity))
+
+    if granularity == "hour":
+        if (last_day - first_day).days >= METRICS_MAX_HOURLY_DAYS:
+            raise ValueError("Hourly metrics are limited to " +
+                             str(METRICS_MAX_HOURLY_DAYS) + " days")
+        buckets = _hourly_series(first_day, last_day)
+    else:
+        buckets = {}
+        days = DailySalesSummary.objects.filter(
+            date__gte=first_day, date__lte=last_day)
+        for day in days:
+            bucket = buckets.setdefault(
+                _day_bucket(day.date, granularity), dict.fromkeys(SUMMARY_FIELDS, 0))
+            for field in SUMMARY_FIELDS:
+                bucket[field] += getattr(day, field)
+
+    series = []
+    totals = dict.fromkeys(SUMMARY_FIELDS, 0)
+    for period, bucket in sorted(buckets.items()):
+        series.append(dict(period=period.isoformat(), **bucket))
+        for field in SUMMARY_FIELDS:
+            totals[field] += bucket[field]
+    return {"series": series, "totals": totals}
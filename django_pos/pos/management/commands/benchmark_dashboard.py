@@ -0,0 +1,61 @@
+import time
+from datetime import datetime, time as day_time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import F, FloatField, Sum, Value
+from django.db.models.functions import Coalesce
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from pos.dashboard import dashboard_context
+from sales.models import Sale
+from sales.summary import sales_totals
+
+
+def legacy_profit(start, end):
+    # Profit the way the dashboard used to compute it, joining the products
+    return Sale.objects.filter(
+        date_added__gte=start,
+        date_added__lt=end
+    ).annotate(
+        total_cost=Coalesce(Sum(F('saledetail__product__buying_price') * F('saledetail__quantity')), Value(0), output_field=FloatField())
+    ).aggregate(
+        profit=Coalesce(
+            Sum(F('amount_payed') - F('total_cost')),
+            Value(0.0),
+            output_field=FloatField()
+        )
+    )['profit']
+
+
+class Command(BaseCommand):
+    help = "Measures the time and the queries needed to compute the dashboard"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--loads", type=int, default=20,
+                            help="Number of times each measurement is repeated")
+
+    def measure(self, name, function, loads):
+        function()  # Warm up
+        start = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(loads):
+                function()
+        elapsed = time.perf_counter() - start
+        self.stdout.write("{}: {:.2f} ms, {} queries".format(
+            name, 1000 * elapsed / loads, len(queries) // loads))
+
+    def handle(self, *args, **options):
+        loads = options["loads"]
+        today = timezone.localdate()
+        start = timezone.make_aware(datetime.combine(today.replace(month=1, day=1), day_time.min))
+        end = timezone.now()
+
+        self.measure("Dashboard, widgets one after another",
+                     lambda: dashboard_context(parallel=False), loads)
+        # Queries of the worker threads are not counted here
+        self.measure("Dashboard, widgets at the same time", dashboard_context, loads)
+        self.measure("Annual profit joining products (before)",
+                     lambda: legacy_profit(start, end), loads)
+        self.measure("Annual profit from cost snapshots (after)",
+                     lambda: sales_totals(start, end)["profit"], loads)
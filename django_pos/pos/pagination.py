@@ -0,0 +1,124 @@
+import base64
+import json
+
+from django.db.models import Q
+
+
+def encode_cursor(order, values):
+    """
+    Args:
+        order: Name of the sort order the values belong to
+        values: JSON serializable values of the row, one per order field
+
+    Returns an opaque URL safe cursor pointing at the row.
+    """
+    data = json.dumps([order, values], default=str)
+    return base64.urlsafe_b64encode(data.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor, order):
+    """
+    Returns the values saved in the cursor, or None when the cursor is
+    invalid or was made for another sort order.
+    """
+    try:
+        cursor_order, values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (TypeError, ValueError):
+        return None
+    if cursor_order != order or not isinstance(values, list):
+        return None
+    return values
+
+
+def keyset_filter(fields, values, descending, after=True):
+    """
+    Builds the filter selecting the rows that come after (or before) the row
+    with the given values, in the order of the fields, so a page is fetched
+    with an index range scan instead of skipping all the previous rows.
+
+    Args:
+        fields: Order fields, never null, the last one must be unique
+        values: Values of the row the page starts from, one per field
+        descending: Whether the fields are sorted in descending order
+        after: True for the next page, False for the previous one
+    """
+    lookup = "__lt" if descending == after else "__gt"
+    condition = Q()
+    for index, field in enumerate(fields):
+        # Equal on the previous fields and past the row on this one
+        branch = Q(**{field + lookup: values[index]})
+        for previous, value in zip(fields[:index], values):
+            branch &= Q(**{previous: value})
+        condition |= branch
+    return condition
+
+
+def order_by(fields, descending, reverse=False):
+    """
+    Returns the order_by arguments for the fields, reversed to fetch the
+    rows before a cursor.
+    """
+    prefix = "-" if descending != reverse else ""
+    return [prefix + field for field in fields]
+
+
+def _field_value(row, field):
+    value = row
+    for name in field.split("__"):
+        value = getattr(value, name)
+    return value
+
+
+def table_page(queryset, params, order_columns, default_column,
+               default_descending=False, max_length=100):
+    """
+    Fetches the rows of one page of a DataTables server-side table.
+
+    Pages reached with the "after" or "before" cursor of the neighbouring page
+    are fetched with keyset pagination, other pages by offset.
+
+    Args:
+        queryset: The filtered rows of the table
+        params: The GET parameters sent by DataTables, plus the optional
+            "after" or "before" cursors
+        order_columns: Order fields of each sortable column index, the last
+            field of each must be unique
+        default_column: Column sorted when the requested one is not sortable
+        default_descending: Direction used when none is requested
+        max_length: Largest page served, DataTables asks for -1 for "All"
+
+    Returns (rows, start, cursors) where start is the offset of the first row
+    and cursors point at the first and last rows of the page.
+    """
+    start = max(int(params.get("start", 0)), 0)
+    length = int(params.get("length", 10))
+    if length <= 0 or length > max_length:
+        length = max_length
+
+    column = int(params.get("order[0][column]", default_column))
+    if column not in order_columns:
+        column = default_column
+    direction = params.get("order[0][dir]")
+    descending = default_descending if direction is None else direction == "desc"
+    fields = order_columns[column]
+    order = str(column) + ("-desc" if descending else "-asc")
+
+    after = decode_cursor(params.get("after", ""), order)
+    before = decode_cursor(params.get("before", ""), order)
+    if after is not None:
+        rows = list(queryset.filter(keyset_filter(fields, after, descending)).order_by(
+            *order_by(fields, descending))[:length])
+    elif before is not None:
+        rows = list(queryset.filter(keyset_filter(fields, before, descending, after=False)).order_by(
+            *order_by(fields, descending, reverse=True))[:length])
+        rows.reverse()
+    else:
+        rows = list(queryset.order_by(*order_by(fields, descending))[start:start + length])
+
+    cursors = {}
+    if rows:
+        cursors = {
+            "first": encode_cursor(order, [_field_value(rows[0], field) for field in fields]),
+            "last": encode_cursor(order, [_field_value(rows[-1], field) for field in fields]),
+        }
+    return rows, start, cursors
@@ -0,0 +1,25 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from products.models import Category, Product
+from products.signals import products_changed
+from sales.models import Sale
+from sales.signals import sales_changed
+from .dashboard import bump_dashboard_version
+
+
+@receiver(post_save, sender=Sale)
+@receiver(post_delete, sender=Sale)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def dashboard_data_changed(sender, **kwargs):
+    # Bumped after commit so a concurrent load can not cache the old data again
+    transaction.on_commit(bump_dashboard_version)
+
+
+@receiver(sales_changed)
+@receiver(products_changed)
+def dashboard_bulk_changed(sender, **kwargs):
+    bump_dashboard_version()
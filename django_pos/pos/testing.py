@@ -0,0 +1,33 @@
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase, override_settings
+from products.catalog import get_catalog
+
+# Every test starts from an empty cache of its own
+TEST_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+class CacheResetMixin:
+    """
+    Empties the test cache and the worker's product catalog before each test,
+    so nothing cached by the previous test is served again.
+    """
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        get_catalog().reload()
+
+
+@override_settings(CACHES=TEST_CACHES)
+class POSTestCase(CacheResetMixin, TestCase):
+    """
+    Base of the tests of every app.
+    """
+
+
+@override_settings(CACHES=TEST_CACHES)
+class POSTransactionTestCase(CacheResetMixin, TransactionTestCase):
+    """
+    Base of the tests whose worker threads, with their own connections, must
+    see the data, so they do not run inside a transaction.
+    """
@@ -1,3 +1,154 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import override_settings
+from django.utils import timezone
+from customers.models import Customer
+from products.importer import import_products
+from products.models import Category, Product
+from sales.models import Sale
+from sales.services import checkout, parse_sale
+from .dashboard import (DASHBOARD_VERSION_KEY, cached_dashboard_context, dashboard_version,
+                        widget_context)
+from .testing import POSTransactionTestCase
+
+
+class DashboardTestCase(POSTransactionTestCase):
+    """
+    Widgets are computed by worker threads with their own connections, so
+    these tests do not run inside a transaction.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user("manager", password="secret")
+        self.client.force_login(self.user)
+        self.customer = Customer.objects.create(first_name="Ann", last_name="Lee")
+        self.category = Category.objects.create(
+            name="Drinks", description="Drinks", status="ACTIVE")
+        self.soda = Product.objects.create(
+            name="Soda", description="Soda", status="ACTIVE", category=self.category,
+            price=2, buying_price=1, stock=10)
+
+    def sale_data(self, quantity):
+        return {"customer": self.customer.id, "sub_total": 2 * quantity,
+                "grand_total": 2 * quantity, "tax_amount": 0, "tax_percentage": 0,
+                "amount_payed": 2 * quantity, "amount_change": 0,
+                "products": [{"id": self.soda.id, "price": 2, "quantity": quantity,
+                              "total_product": 2 * quantity}]}
+
+    def checkout(self, data):
+        sale, _ = checkout(parse_sale(data), data["products"])
+        return sale
+
+
+class DashboardCacheTests(DashboardTestCase):
+
+    def test_cached_widgets_cost_no_queries(self):
+        context, pending = cached_dashboard_context()
+        self.assertEqual(pending, [])
+        self.assertEqual(context["products"], 1)
+        self.assertEqual(context["daily_products_sold"], 0)
+
+        with self.assertNumQueries(0):
+            cached, pending = cached_dashboard_context()
+            widget_context("units")
+        self.assertEqual(pending, [])
+        self.assertEqual(cached, context)
+
+    def test_checkout_invalidates_the_dashboard(self):
+        cached_dashboard_context()
+        version = dashboard_version()
+
+        self.checkout(self.sale_data(3))
+
+        self.assertNotEqual(dashboard_version(), version)
+        context, _ = cached_dashboard_context()
+        self.assertEqual(context["daily_products_sold"], 3)
+        self.assertEqual(context["daily_profit"], 3)
+        self.assertEqual(context["top_products_names_list"], ["Soda"])
+
+    def test_product_changes_invalidate_the_dashboard(self):
+        self.assertEqual(widget_context("counts"), {"products": 1, "categories": 1})
+        Product.objects.create(
+            name="Water", description="Water", status="ACTIVE", category=self.category,
+            price=1, buying_price=0.5)
+        self.assertEqual(widget_context("counts"), {"products": 2, "categories": 1})
+
+    def test_imported_products_invalidate_the_dashboard(self):
+        self.assertEqual(widget_context("counts"), {"products": 1, "categories": 1})
+        import_products(StringIO("name,category,price\nChips,Snacks,1.5\n"))
+        self.assertEqual(widget_context("counts"), {"products": 2, "categories": 2})
+
+    def test_widget_view(self):
+        response = self.client.get("/api/widgets/units")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()), {
+            "daily_products_sold", "weekly_products_sold", "monthly_products_sold"})
+        self.assertEqual(self.client.get("/api/widgets/nope").status_code, 404)
+
+    @override_settings(
+        STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage")
+    def test_index_waits_for_the_widgets(self):
+        with override_settings(DASHBOARD_WIDGET_WAIT=None):
+            response = self.client.get("/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["pending_widgets"], [])
+        self.assertEqual(response.context["products"], 1)
+        self.assertNotContains(response, "pending_widgets")
+
+    @override_settings(
+        STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage")
+    def test_index_loads_the_pending_widgets(self):
+        with mock.patch("pos.views.cached_dashboard_context", return_value=({}, ["earnings"])):
+            response = self.client.get("/")
+        self.assertContains(
+            response, '<script id="pending_widgets" type="application/json">["earnings"]</script>')
+        self.assertContains(response, 'data-widget-url="/api/widgets/WIDGET"')
+
+
+class MetricsConditionalTests(DashboardTestCase):
+    url = "/api/metrics?start=2026-01-01&end=2026-01-31"
+
+    def setUp(self):
+        super().setUp()
+        # The dashboard data last changed an hour ago
+        cache.set(DASHBOARD_VERSION_KEY, {
+            "version": "initial", "modified": timezone.now() - timedelta(hours=1)}, timeout=None)
+
+    def test_unchanged_metrics_are_not_sent_again(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(self.client.get(
+            self.url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+        self.assertEqual(self.client.get(
+            self.url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]).status_code, 304)
+
+    def test_back_dated_sale_changes_the_metrics(self):
+        before = self.client.get(self.url)
+        self.assertEqual(before.json()["totals"]["sale_count"], 0)
+
+        # A till sends a sale made in January, long before it is synced
+        data = self.sale_data(2)
+        data["checkout_key"] = "till-1-0001"
+        data["date_added"] = "2026-01-02T10:30:00+03:00"
+        self.client.post("/sales/batch", json.dumps({"sales": [data]}),
+                         content_type="application/json")
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=before["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["totals"]["sale_count"], 1)
+        self.assertNotEqual(response["ETag"], before["ETag"])
+        self.assertEqual(self.client.get(
+            self.url, HTTP_IF_MODIFIED_SINCE=before["Last-Modified"]).status_code, 200)
+
+    def test_deleted_sale_changes_the_metrics(self):
+        sale = self.checkout(self.sale_data(1))
+        before = self.client.get(self.url)
+        Sale.objects.filter(id=sale.id).delete()
+        self.assertNotEqual(self.client.get(self.url)["ETag"], before["ETag"])
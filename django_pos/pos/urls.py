@@ -5,4 +5,8 @@ from . import views
 app_name = "pos"
 urlpatterns = [
     path('', views.index, name='index'),
+    # Dashboard metrics as JSON
+    path('api/metrics', views.metrics_view, name='metrics'),
+    # Dashboard widgets still loading when the page was rendered
+    path('api/widgets/<str:name>', views.widget_view, name='widget'),
 ]
@@ -1,8 +1,20 @@
 from django.contrib import admin
 
 
-from .models import Category, Product, SubCategory
+from .models import Category, Product, ProductBarcode, StockMovement, SubCategory
+
+
+class ProductBarcodeInline(admin.TabularInline):
+    model = ProductBarcode
+    extra = 1
+
+
+@admin.register(Product)
+class ProductAdmin(admin.ModelAdmin):
+    inlines = [ProductBarcodeInline]
+
 
 admin.site.register(Category)
-admin.site.register(Product)
 admin.site.register(SubCategory)
+admin.site.register(StockMovement)
+admin.site.register(ProductBarcode)
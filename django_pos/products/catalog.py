@@ -0,0 +1,269 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max, Q
+from .models import CatalogChange, Product, ProductBarcode
+
+CATALOG_VERSION_KEY = "catalog:version"
+# A worker further behind than this reloads the whole catalog instead
+CATALOG_MAX_CHANGES = 1000
+# Older changes are pruned, workers that far behind reload everything anyway
+CATALOG_KEEP_CHANGES = 10 * CATALOG_MAX_CHANGES
+# Seconds a worker trusts the shared version before asking the database
+CATALOG_MAX_AGE = 60
+
+
+def record_catalog_change(product_id=None, category_id=None):
+    """
+    Logs a change of the catalog, meant to run in the transaction making it.
+    The new version is published to the workers once it commits.
+
+    Args:
+        product_id: ID of the product that changed
+        category_id: ID of the category that changed, whose products are
+            refreshed. Without any ID every worker reloads the whole catalog.
+    """
+    change = CatalogChange.objects.create(
+        product_id=product_id, category_id=category_id)
+    if change.id % CATALOG_MAX_CHANGES == 0:
+        CatalogChange.objects.filter(
+            id__lte=change.id - CATALOG_KEEP_CHANGES).delete()
+    transaction.on_commit(lambda: publish_catalog_version(change.id))
+    return change.id
+
+
+def publish_catalog_version(version):
+    # Never moves back when two transactions commit out of order
+    if version > (cache.get(CATALOG_VERSION_KEY) or 0):
+        cache.set(CATALOG_VERSION_KEY, version, timeout=None)
+
+
+def catalog_version():
+    """
+    Returns the ID of the last catalog change, shared by every worker.
+    """
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        version = CatalogChange.objects.aggregate(version=Max("id"))["version"] or 0
+        cache.set(CATALOG_VERSION_KEY, version, timeout=None)
+    return version
+
+
+class ProductRecord:
+    """
+    What the till needs to know about a product, without a model instance.
+    The stock is not kept: sales and compactions change it without telling
+    the catalog, it is read from the stock ledger where it is needed.
+    """
+    __slots__ = ("id", "name", "status", "category_id", "category", "subcategory",
+                 "price", "buying_price")
+
+    # Product fields each record is loaded from, in the order of the slots
+    FIELDS = ("id", "name", "status", "category_id", "category__name", "subcategory_id",
+              "price", "buying_price")
+
+    def __init__(self, id, name, status, category_id, category, subcategory,
+                 price, buying_price):
+        self.id = id
+        self.name = name
+        self.status = status
+        self.category_id = category_id
+        self.category = category
+        self.subcategory = subcategory
+        self.price = price
+        self.buying_price = buying_price
+
+    def to_json(self):
+        """
+        Returns the product as the sale page expects it, like Product.to_json
+        without the stock.
+        """
+        return {
+            "id": self.id,
+            "name": self.name,
+            "status": self.status,
+            "category": self.category,
+            "subcategory": self.subcategory,
+            "buying_price": self.buying_price,
+            "price": self.price,
+            "text": self.name,
+            "quantity": 1,
+            "total_product": 0,
+        }
+
+
+def _load_records(products):
+    return {row[0]: ProductRecord(*row)
+            for row in products.values_list(*ProductRecord.FIELDS)}
+
+
+class ProductCatalog:
+    """
+    Every product of the catalog as a ProductRecord, kept by each worker.
+
+    It is loaded once and then refreshed with the products named by the
+    changes newer than the loaded version.
+    """
+
+    def __init__(self):
+        self.records = None
+        self.version = 0
+        self.checked_at = 0
+        self._lock = threading.Lock()
+
+    def reload(self):
+        # Read first, so changes made while loading are applied again later
+        version = CatalogChange.objects.aggregate(version=Max("id"))["version"] or 0
+        self.records = _load_records(Product.objects.all())
+        self.version = version
+        self.checked_at = time.monotonic()
+
+    def refresh(self):
+        changes = list(CatalogChange.objects.filter(
+            id__gt=self.version).order_by("id").values_list(
+            "id", "product_id", "category_id")[:CATALOG_MAX_CHANGES + 1])
+        if len(changes) > CATALOG_MAX_CHANGES or any(
+                product_id is None and category_id is None
+                for _, product_id, category_id in changes):
+            self.reload()
+            return
+
+        product_ids = {product_id for _, product_id, _ in changes if product_id}
+        category_ids = {category_id for _, _, category_id in changes if category_id}
+        # Products that were in a deleted category have no category_id anymore
+        product_ids.update(record.id for record in self.records.values()
+                           if record.category_id in category_ids)
+        if product_ids or category_ids:
+            loaded = _load_records(Product.objects.filter(
+                Q(id__in=product_ids) | Q(category_id__in=category_ids)))
+            for product_id in product_ids - loaded.keys():
+                # Deleted
+                self.records.pop(product_id, None)
+            self.records.update(loaded)
+        if changes:
+            self.version = changes[-1][0]
+        self.checked_at = time.monotonic()
+
+    def sync(self):
+        """
+        Brings the records up to date with the shared catalog version.
+        """
+        stale = self.records is None or catalog_version() > self.version or \
+            time.monotonic() - self.checked_at > CATALOG_MAX_AGE
+        if stale:
+            with self._lock:
+                if self.records is None:
+                    self.reload()
+                elif catalog_version() > self.version or \
+                        time.monotonic() - self.checked_at > CATALOG_MAX_AGE:
+                    self.refresh()
+        return self
+
+    def get_many(self, ids):
+        """
+        Args:
+            ids: IDs of the products
+
+        Returns the records of the products by ID. Products the worker does
+        not know yet are loaded from the database, missing ones are left out.
+        """
+        records = {}
+        unknown = []
+        for product_id in ids:
+            record = self.records.get(product_id)
+            if record is None:
+                unknown.append(product_id)
+            else:
+                records[product_id] = record
+        if unknown:
+            loaded = _load_records(Product.objects.filter(id__in=unknown))
+            self.records.update(loaded)
+            records.update(loaded)
+        return records
+
+    def search(self, term, limit=10):
+        """
+        Returns the records whose name contains the term, in ID order.
+        """
+        term = term.casefold()
+        found = []
+        for product_id in sorted(self.records):
+            record = self.records[product_id]
+            if term in record.name.casefold():
+                found.append(record)
+                if len(found) == limit:
+                    break
+        return found
+
+
+_catalog = ProductCatalog()
+
+
+def get_catalog():
+    """
+    Returns the product catalog of this worker, up to date.
+    """
+    return _catalog.sync()
+
+
+class LRUCache:
+    """
+    Thread-safe mapping that keeps the maxsize most recently used keys.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# Product IDs of the codes scanned in this worker, with the catalog version
+# they were read at
+_barcodes = LRUCache(settings.BARCODE_CACHE_SIZE)
+
+
+def lookup_barcode(code):
+    """
+    Args:
+        code: The scanned barcode or SKU
+
+    Returns the product JSON used by the sale page, or None when no product
+    has the code. Codes scanned before are resolved in memory while the
+    catalog did not change; others cost one indexed query.
+    """
+    catalog = get_catalog()
+    entry = _barcodes.get(code)
+    if entry is not None and entry[0] == catalog.version:
+        product_id = entry[1]
+    else:
+        product_id = ProductBarcode.objects.filter(
+            code=code).values_list("product_id", flat=True).first()
+        # Unknown codes too, a cashier often scans the same one again
+        _barcodes.set(code, (catalog.version, product_id))
+
+    if product_id is None:
+        return None
+    record = catalog.get_many([product_id]).get(product_id)
+    return record.to_json() if record is not None else None
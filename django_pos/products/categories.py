@@ -0,0 +1,122 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from .models import Category, SubCategory
+
+CATEGORY_TREE_VERSION_KEY = "category_tree:version"
+
+# Tree of the version last read by this worker
+_tree = None
+_tree_version = None
+
+
+class CategoryNode:
+    """
+    A category of the tree with its subcategories, without a model instance.
+    """
+    __slots__ = ("id", "name", "status", "subcategories")
+
+    def __init__(self, id, name, status):
+        self.id = id
+        self.name = name
+        self.status = status
+        self.subcategories = []
+
+    def __str__(self):
+        return self.name
+
+
+class SubCategoryNode:
+    """
+    A subcategory of the tree, category points to its CategoryNode.
+    """
+    __slots__ = ("id", "name", "category")
+
+    def __init__(self, id, name, category):
+        self.id = id
+        self.name = name
+        self.category = category
+
+    @property
+    def category_id(self):
+        return self.category.id if self.category else None
+
+    def __str__(self):
+        return self.name
+
+
+class CategoryTree:
+    """
+    Every category with its subcategories, as the product forms, the
+    subcategory pages and the filters of the products list show them.
+    """
+
+    def __init__(self, categories, subcategories):
+        self.categories = categories
+        self.subcategories = subcategories
+        self._categories = {category.id: category for category in categories}
+
+    @classmethod
+    def load(cls):
+        categories = [CategoryNode(*row) for row in Category.objects.order_by(
+            "id").values_list("id", "name", "status")]
+        by_id = {category.id: category for category in categories}
+        subcategories = []
+        for id, name, category_id in SubCategory.objects.order_by("id").values_list(
+                "id", "name", "category_id"):
+            category = by_id.get(category_id)
+            subcategory = SubCategoryNode(id, name, category)
+            if category is not None:
+                category.subcategories.append(subcategory)
+            subcategories.append(subcategory)
+        return cls(categories, subcategories)
+
+    @property
+    def active_categories(self):
+        return [category for category in self.categories if category.status == "ACTIVE"]
+
+    def category(self, category_id):
+        """
+        Returns the CategoryNode with that ID, None when there is none.
+        """
+        return self._categories.get(category_id)
+
+
+def _tree_key(version):
+    return "category_tree:" + str(version)
+
+
+def get_category_tree():
+    """
+    Returns the CategoryTree shared by every worker through the cache.
+
+    The tree is stored under its version, which every write of a category or
+    subcategory replaces, so a tree built from data read before a write is
+    never served after it. Only the version is read from the cache while it
+    does not change.
+    """
+    global _tree, _tree_version
+    version = cache.get(CATEGORY_TREE_VERSION_KEY)
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(CATEGORY_TREE_VERSION_KEY, version, timeout=None):
+            version = cache.get(CATEGORY_TREE_VERSION_KEY)
+    if _tree is not None and version == _tree_version:
+        return _tree
+
+    tree = cache.get(_tree_key(version))
+    if tree is None:
+        tree = CategoryTree.load()
+        cache.set(_tree_key(version), tree)
+    _tree, _tree_version = tree, version
+    return tree
+
+
+def invalidate_category_tree():
+    """
+    Makes every worker load the tree again once the current transaction
+    commits, meant to run when a category or subcategory is written.
+    """
+    transaction.on_commit(lambda: cache.set(
+        CATEGORY_TREE_VERSION_KEY, time.time_ns(), timeout=None))
@@ -0,0 +1,258 @@
+import csv
+from functools import partial
+from itertools import islice
+
+from django.db import connection, transaction
+from .catalog import record_catalog_change
+from .models import Category, Product, ProductBarcode, StockMovement, SubCategory
+from .signals import products_changed
+
+# Rows parsed and written per transaction
+IMPORT_CHUNK_SIZE = 1000
+# Columns of the CSV, only name and category are required
+IMPORT_COLUMNS = ("sku", "name", "description", "category", "subcategory",
+                  "price", "buying_price", "stock", "status")
+IMPORT_REQUIRED_COLUMNS = ("name", "category")
+# Fields an imported row overwrites on an existing product, the stock is
+# adjusted through the ledger instead
+IMPORT_UPDATE_FIELDS = ("name", "description", "status", "category", "subcategory",
+                        "price", "buying_price")
+
+
+def _parse_number(row, column, parse):
+    value = (row.get(column) or "").strip()
+    if not value:
+        return None
+    try:
+        number = parse(value)
+    except ValueError:
+        raise ValueError("Invalid " + column + ": " + value)
+    if number < 0:
+        raise ValueError("Negative " + column + ": " + value)
+    return number
+
+
+def parse_row(row):
+    """
+    Returns the product fields of a CSV row, raises ValueError when invalid.
+    """
+    values = {column: (row.get(column) or "").strip() for column in
+              ("sku", "name", "description", "category", "subcategory")}
+    for column in IMPORT_REQUIRED_COLUMNS:
+        if not values[column]:
+            raise ValueError("Missing " + column)
+    values["price"] = _parse_number(row, "price", float)
+    values["buying_price"] = _parse_number(row, "buying_price", float)
+    values["stock"] = _parse_number(row, "stock", int)
+    values["status"] = (row.get("status") or "").strip().upper() or "ACTIVE"
+    if values["status"] not in dict(Product.STATUS_CHOICES):
+        raise ValueError("Invalid status: " + values["status"])
+    return values
+
+
+class CategoryMap:
+    """
+    The categories and subcategories by name, loaded once per import. Names
+    not found are created, so a new store can be imported in one go.
+    """
+
+    def __init__(self):
+        self.categories = {name.casefold(): id for id, name in
+                           Category.objects.values_list("id", "name")}
+        self.subcategories = {(category_id, name.casefold()): id for id, category_id, name in
+                              SubCategory.objects.values_list("id", "category_id", "name")}
+        self.created = 0
+
+    def category_id(self, name):
+        key = name.casefold()
+        if key not in self.categories:
+            self.categories[key] = Category.objects.create(
+                name=name, description=name, status="ACTIVE").id
+            self.created += 1
+        return self.categories[key]
+
+    def subcategory_id(self, category_id, name):
+        key = (category_id, name.casefold())
+        if key not in self.subcategories:
+            self.subcategories[key] = SubCategory.objects.create(
+                category_id=category_id, name=name).id
+            self.created += 1
+        return self.subcategories[key]
+
+
+def _update_products(products):
+    """
+    Saves the IMPORT_UPDATE_FIELDS of the products with one prepared UPDATE
+    run for each of them. bulk_update writes a CASE over the whole batch for
+    every field, which is many times slower for thousands of products.
+    """
+    if not products:
+        return
+    fields = [Product._meta.get_field(name) for name in IMPORT_UPDATE_FIELDS]
+    quote = connection.ops.quote_name
+    sql = "UPDATE " + quote(Product._meta.db_table) + " SET " + ", ".join(
+        quote(field.column) + " = %s" for field in fields) + " WHERE " + quote(
+        Product._meta.pk.column) + " = %s"
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [
+            [field.get_db_prep_save(getattr(product, field.attname), connection)
+             for field in fields] + [product.pk]
+            for product in products
+        ])
+
+
+def _import_chunk(rows, categories, seen, report):
+    """
+    Creates or updates the products of one chunk of (line, values) rows,
+    with a few queries whatever the size of the chunk.
+    """
+    by_sku = dict(ProductBarcode.objects.filter(
+        code__in=[values["sku"] for _, values in rows if values["sku"]]
+    ).values_list("code", "product_id"))
+    by_name = {}
+    for product_id, name in Product.objects.filter(
+            name__in=[values["name"] for _, values in rows]).values_list("id", "name"):
+        by_name.setdefault(name, []).append(product_id)
+
+    resolved = []
+    for line, values in rows:
+        # The SKU identifies the product, the name is used when it has none yet
+        product_id = by_sku.get(values["sku"])
+        if product_id is None:
+            matches = by_name.get(values["name"], [])
+            if len(matches) > 1:
+                report["errors"].append(
+                    {"line": line, "error": "Several products named " + values["name"]})
+                continue
+            product_id = matches[0] if matches else None
+        if product_id is None and values["price"] is None:
+            report["errors"].append({"line": line, "error": "Missing price"})
+            continue
+
+        keys = [("id", product_id) if product_id else ("name", values["name"])]
+        if values["sku"]:
+            keys.append(("sku", values["sku"]))
+        repeated = [seen[key] for key in keys if key in seen]
+        if repeated:
+            report["errors"].append(
+                {"line": line, "error": "Same product as line " + str(repeated[0])})
+            continue
+        for key in keys:
+            seen[key] = line
+        resolved.append((line, product_id, values))
+
+    # Locked until the chunk commits, so a sale made meanwhile can not change
+    # the stock the adjustments are computed from. In ID order like checkout,
+    # so the two can not deadlock
+    existing = Product.objects.with_current_stock().select_for_update().order_by("id").in_bulk(
+        [product_id for _, product_id, _ in resolved if product_id])
+    created = []
+    changed = []
+    movements = []
+    barcodes = []
+    for line, product_id, values in resolved:
+        attributes = {
+            "name": values["name"],
+            "description": values["description"],
+            "status": values["status"],
+            "category_id": categories.category_id(values["category"]),
+        }
+        attributes["subcategory_id"] = categories.subcategory_id(
+            attributes["category_id"], values["subcategory"]) if values["subcategory"] else None
+
+        if product_id is None:
+            product = Product(price=values["price"], buying_price=values["buying_price"] or 0,
+                              stock=values["stock"] or 0, **attributes)
+            created.append((line, product, values["sku"]))
+            continue
+
+        product = existing[product_id]
+        if values["price"] is not None:
+            attributes["price"] = values["price"]
+        if values["buying_price"] is not None:
+            attributes["buying_price"] = values["buying_price"]
+        # Importing the same file again writes nothing for unchanged products
+        if any(getattr(product, field) != value for field, value in attributes.items()):
+            for field, value in attributes.items():
+                setattr(product, field, value)
+            changed.append(product)
+        report["updated"] += 1
+        if values["sku"] and values["sku"] not in by_sku:
+            barcodes.append(ProductBarcode(product_id=product_id, code=values["sku"]))
+        # The counted stock is recorded as an adjustment in the ledger
+        if values["stock"] is not None and values["stock"] != product.current_stock:
+            movements.append(StockMovement(
+                product_id=product_id, quantity=values["stock"] - product.current_stock,
+                reason="ADJUSTMENT", reference="Product import"))
+
+    new_products = [product for _, product, _ in created]
+    Product.objects.bulk_create(new_products, batch_size=500)
+    if any(product.pk is None for product in new_products):
+        # The database can not return the ids of bulk inserted rows, the
+        # names of new products are not used by any other product
+        ids = dict(Product.objects.filter(
+            name__in=[product.name for product in new_products]).values_list("name", "id"))
+        for product in new_products:
+            product.pk = ids[product.name]
+    for line, product, sku in created:
+        # Later chunks find the product by name, it must not be imported twice
+        seen[("id", product.pk)] = line
+        if sku:
+            barcodes.append(ProductBarcode(product=product, code=sku))
+    _update_products(changed)
+    StockMovement.objects.bulk_create(movements, batch_size=500)
+    ProductBarcode.objects.bulk_create(barcodes, batch_size=500)
+
+    report["created"] += len(new_products)
+
+
+def import_products(lines, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Creates or updates the products of a CSV file, read chunk by chunk.
+
+    Every chunk is written in one transaction with bulk queries: products are
+    matched by SKU, then by name, categories and subcategories are resolved
+    by name from a map loaded once. An invalid row does not stop the import,
+    it is reported with its line number.
+
+    Args:
+        lines: Iterable over the lines of the CSV file, with a header row
+        chunk_size: Rows written per transaction
+
+    Returns a {"created", "updated", "categories", "errors"} dict, errors is
+    a list of {"line", "error"} dicts. Raises ValueError when a column is
+    missing and csv.Error when the file is not a CSV.
+    """
+    report = {"created": 0, "updated": 0, "categories": 0, "errors": []}
+    reader = csv.DictReader(lines)
+    header = [column.strip().lower() for column in reader.fieldnames or []]
+    missing = [column for column in IMPORT_REQUIRED_COLUMNS if column not in header]
+    if missing:
+        raise ValueError("Missing columns: " + ", ".join(missing))
+    reader.fieldnames = header
+
+    categories = CategoryMap()
+    # Line of the first row of each product, to report repeated ones
+    seen = {}
+    numbered = ((reader.line_num, row) for row in reader)
+    while True:
+        chunk = list(islice(numbered, chunk_size))
+        if not chunk:
+            break
+        rows = []
+        for line, row in chunk:
+            try:
+                rows.append((line, parse_row(row)))
+            except ValueError as e:
+                report["errors"].append({"line": line, "error": str(e)})
+        if rows:
+            with transaction.atomic():
+                _import_chunk(rows, categories, seen, report)
+
+    report["categories"] = categories.created
+    # Invalid rows are found before the repeated ones of their chunk
+    report["errors"].sort(key=lambda error: error["line"])
+    # Bulk queries send no signals, every worker reloads its catalog instead
+    record_catalog_change()
+    transaction.on_commit(partial(products_changed.send, sender=Product))
+    return report
@@ -0,0 +1,104 @@
+from django.urls import reverse
+from pos.pagination import table_page
+from .models import Product
+
+# Largest page served, DataTables asks for -1 when "All" is selected
+PRODUCTS_PAGE_MAX = 100
+
+# Order fields of each sortable column of the products table, all indexed
+PRODUCTS_ORDER_COLUMNS = {
+    0: ["id"],
+    2: ["name", "id"],
+    7: ["price", "id"],
+}
+PRODUCTS_DEFAULT_COLUMN = 0
+
+
+def _parse_price(value):
+    if not value:
+        return None
+    return float(value)
+
+
+def filter_products(products, search="", subcategory=None, status=None,
+                    min_price=None, max_price=None):
+    """
+    Args:
+        products: Queryset of products to filter
+        search: Text the product name must contain
+        subcategory: ID of the subcategory, None for all
+        status: "ACTIVE" or "INACTIVE", None for both
+        min_price: Lowest selling price included, None for no limit
+        max_price: Highest selling price included, None for no limit
+    """
+    if search:
+        products = products.filter(name__icontains=search)
+    if subcategory:
+        products = products.filter(subcategory_id=subcategory)
+    if status:
+        products = products.filter(status=status)
+    if min_price is not None:
+        products = products.filter(price__gte=min_price)
+    if max_price is not None:
+        products = products.filter(price__lte=max_price)
+    return products
+
+
+def product_page(params):
+    """
+    Serves one page of the products table to DataTables server-side
+    processing, with the category of each product loaded in the same query.
+
+    Args:
+        params: The GET parameters sent by DataTables, plus the optional
+            "subcategory", "status", "min_price", "max_price" filters and
+            "after" or "before" cursors (see table_page)
+
+    Returns the DataTables response as a dict.
+    """
+    filters = {
+        "search": params.get("search[value]", "").strip(),
+        "subcategory": params.get("subcategory") or None,
+        "status": params.get("status") or None,
+        "min_price": _parse_price(params.get("min_price")),
+        "max_price": _parse_price(params.get("max_price")),
+    }
+    if filters["status"] not in (None, "ACTIVE", "INACTIVE"):
+        raise ValueError("Invalid status: " + filters["status"])
+    if filters["subcategory"] is not None and not filters["subcategory"].isdigit():
+        raise ValueError("Invalid subcategory: " + filters["subcategory"])
+
+    records_total = Product.objects.count()
+    products = filter_products(Product.objects.all(), **filters)
+    if any(value is not None and value != "" for value in filters.values()):
+        records_filtered = products.count()
+    else:
+        records_filtered = records_total
+
+    rows, start, cursors = table_page(
+        products.with_current_stock().select_related("category"), params,
+        PRODUCTS_ORDER_COLUMNS, PRODUCTS_DEFAULT_COLUMN, max_length=PRODUCTS_PAGE_MAX)
+
+    data = []
+    for number, product in enumerate(rows, start + 1):
+        data.append({
+            "id": product.id,
+            "number": number,
+            "name": product.name,
+            "description": product.description,
+            "category": product.category.name if product.category else "",
+            "stock": product.current_stock,
+            "buying_price": product.buying_price,
+            "price": product.price,
+            "status": product.status,
+            "update_url": reverse("products:products_update", args=[product.id]),
+            "delete_url": reverse("products:products_delete", args=[product.id]),
+        })
+
+    return {
+        "draw": int(params.get("draw", 0)),
+        "recordsTotal": records_total,
+        "recordsFiltered": records_filtered,
+        "data": data,
+        "cursors": cursors,
+    }
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from products.stock import compact_stock
+
+
+class Command(BaseCommand):
+    help = "Folds the stock movement ledger into the product stock snapshots"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--settle-seconds",
+            type=int,
+            default=60,
+            help="Only compact movements older than this many seconds",
+        )
+
+    def handle(self, *args, **options):
+        compacted = compact_stock(settle_seconds=options["settle_seconds"])
+        self.stdout.write(self.style.SUCCESS(
+            "Compacted the stock of " + str(compacted) + " products"))
@@ -0,0 +1,30 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+from products.importer import IMPORT_CHUNK_SIZE, import_products
+
+
+class Command(BaseCommand):
+    help = "Creates or updates the products listed in a CSV file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV file with a header row")
+        parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE,
+                            help="Rows written per transaction")
+
+    def handle(self, *args, **options):
+        try:
+            with open(options["path"], newline="", encoding="utf-8-sig") as lines:
+                report = import_products(lines, chunk_size=options["chunk_size"])
+        except (OSError, ValueError, csv.Error) as e:
+            raise CommandError(str(e))
+
+        for error in report["errors"]:
+            self.stderr.write("Line " + str(error["line"]) + ": " + error["error"])
+        self.stdout.write(self.style.SUCCESS(
+            "Created " + str(report["created"]) + " products, updated " +
+            str(report["updated"]) + " and created " + str(report["categories"]) +
+            " categories and subcategories"))
+        if report["errors"]:
+            self.stdout.write(self.style.WARNING(
+                str(len(report["errors"])) + " rows were not imported"))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from products.search import SEARCH_TABLE, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Fills the product full-text index again and creates its missing triggers"
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite" or \
+                SEARCH_TABLE not in connection.introspection.table_names():
+            raise CommandError("There is no product search index, it only exists on SQLite")
+
+        missing = rebuild_search_index()
+        if missing:
+            self.stdout.write("Created the missing triggers: " + ", ".join(missing))
+        self.stdout.write(self.style.SUCCESS("Rebuilt the product search index"))
@@ -0,0 +1,37 @@
+# Generated by Django 4.1.5 on 2026-10-18 06:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_product_buying_price'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='stock_compacted_to',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField()),
+                ('reason', models.CharField(choices=[('SALE', 'Sale'), ('ADJUSTMENT', 'Adjustment')], max_length=20)),
+                ('reference', models.CharField(blank=True, max_length=64, null=True)),
+                ('date_added', models.DateTimeField(auto_now_add=True)),
+                ('product', models.ForeignKey(db_column='product', on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='products.product')),
+            ],
+            options={
+                'db_table': 'StockMovements',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['product', 'id'], name='stockmovement_product_id'),
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Full-text index of the products for the till autocomplete, SQLite only
+
+from django.db import migrations
+
+CREATE_STATEMENTS = [
+    # Row IDs are the product IDs, prefix indexes make "term*" queries cheap
+    """
+    CREATE VIRTUAL TABLE ProductSearch USING fts5(
+        name, description, category,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '1 2 3'
+    )
+    """,
+    # ORDER BY rank uses bm25 weighting name over category over description
+    """
+    INSERT INTO ProductSearch (ProductSearch, rank) VALUES ('rank', 'bm25(10.0, 1.0, 4.0)')
+    """,
+    """
+    INSERT INTO ProductSearch (rowid, name, description, category)
+    SELECT Product.id, Product.name, Product.description, COALESCE(Category.name, '')
+    FROM Product LEFT JOIN Category ON Category.id = Product.category
+    """,
+    """
+    CREATE TRIGGER product_search_insert AFTER INSERT ON Product BEGIN
+        INSERT INTO ProductSearch (rowid, name, description, category)
+        VALUES (new.id, new.name, new.description,
+                COALESCE((SELECT name FROM Category WHERE id = new.category), ''));
+    END
+    """,
+    # Stock changes do not touch the index
+    """
+    CREATE TRIGGER product_search_update AFTER UPDATE OF name, description, category ON Product BEGIN
+        DELETE FROM ProductSearch WHERE rowid = old.id;
+        INSERT INTO ProductSearch (rowid, name, description, category)
+        VALUES (new.id, new.name, new.description,
+                COALESCE((SELECT name FROM Category WHERE id = new.category), ''));
+    END
+    """,
+    """
+    CREATE TRIGGER product_search_delete AFTER DELETE ON Product BEGIN
+        DELETE FROM ProductSearch WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER product_search_category AFTER UPDATE OF name ON Category BEGIN
+        UPDATE ProductSearch SET category = new.name
+        WHERE rowid IN (SELECT id FROM Product WHERE category = new.id);
+    END
+    """,
+]
+
+DROP_STATEMENTS = [
+    "DROP TRIGGER IF EXISTS product_search_category",
+    "DROP TRIGGER IF EXISTS product_search_delete",
+    "DROP TRIGGER IF EXISTS product_search_update",
+    "DROP TRIGGER IF EXISTS product_search_insert",
+    "DROP TABLE IF EXISTS ProductSearch",
+]
+
+
+def create_search_index(apps, schema_editor):
+    # Other databases search the worker's catalog instead, see products.search
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in CREATE_STATEMENTS:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in DROP_STATEMENTS:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_product_list_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
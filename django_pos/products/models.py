@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
 from django.forms import model_to_dict
 
 class Category(models.Model):
@@ -34,6 +36,21 @@ class SubCategory(models.Model):
     def __str__(self):
         return self.name
     
+class ProductQuerySet(models.QuerySet):
+    def with_current_stock(self):
+        """
+        Annotates current_stock: the stock snapshot plus the movements that
+        were not compacted into it yet.
+        """
+        tail = StockMovement.objects.filter(
+            product=OuterRef("pk"),
+            id__gt=OuterRef("stock_compacted_to"),
+        ).order_by().values("product").annotate(
+            total=Sum("quantity")).values("total")
+        return self.annotate(
+            current_stock=models.F("stock") + Coalesce(Subquery(tail), 0))
+
+
 class Product(models.Model):
     STATUS_CHOICES = (
         ("ACTIVE", "Active"),
@@ -65,19 +82,97 @@ class Product(models.Model):
     buying_price = models.FloatField(default=0)
     price = models.FloatField(default=0)
     stock = models.PositiveIntegerField(default=0)  # New field for stock count
+    # Last StockMovement already folded into stock, newer ones are the tail
+    stock_compacted_to = models.BigIntegerField(default=0)
 
+    objects = ProductQuerySet.as_manager()
 
     class Meta:
         db_table = "Product"
+        # Sortable columns of the products list, the ID breaks ties
+        indexes = [
+            models.Index(fields=["name", "id"], name="product_name_id"),
+            models.Index(fields=["price", "id"], name="product_price_id"),
+        ]
 
     def __str__(self) -> str:
         return self.name
 
     def to_json(self):
-        item = model_to_dict(self)
+        # The stock field is only the compacted snapshot, the current stock
+        # is checked at checkout
+        item = model_to_dict(self, exclude=["stock", "stock_compacted_to"])
         item['id'] = self.id
         item['text'] = self.name
         item['category'] = self.category.name
         item['quantity'] = 1
         item['total_product'] = 0
         return item
+
+
+class ProductBarcode(models.Model):
+    """
+    Barcode or SKU printed on a product. A product can have several, for
+    example the EAN of the unit and the one of the pack.
+    """
+    product = models.ForeignKey(
+        Product,
+        related_name="barcodes",
+        on_delete=models.CASCADE,
+        db_column="product",
+    )
+    code = models.CharField(max_length=64, unique=True)
+
+    class Meta:
+        db_table = "ProductBarcodes"
+
+    def __str__(self) -> str:
+        return self.code + " | Product: " + str(self.product_id)
+
+
+class StockMovement(models.Model):
+    """
+    Append-only ledger of stock changes. Rows are never updated: the
+    compact_stock command periodically folds them into Product.stock.
+    """
+    REASON_CHOICES = (
+        ("SALE", "Sale"),
+        ("ADJUSTMENT", "Adjustment"),
+    )
+
+    product = models.ForeignKey(
+        Product,
+        related_name="stock_movements",
+        on_delete=models.CASCADE,
+        db_column="product",
+    )
+    quantity = models.IntegerField()  # Negative when the stock goes down
+    reason = models.CharField(choices=REASON_CHOICES, max_length=20)
+    reference = models.CharField(max_length=64, blank=True, null=True)
+    date_added = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "StockMovements"
+        indexes = [
+            models.Index(fields=["product", "id"], name="stockmovement_product_id"),
+        ]
+
+    def __str__(self) -> str:
+        return "Movement ID: " + str(self.id) + " Product: " + str(self.product_id) + " Quantity: " + str(self.quantity)
+
+
+class CatalogChange(models.Model):
+    """
+    Log of the product and category changes. The ID of the last change is the
+    catalog version, and the rows newer than the version a worker has loaded
+    tell it which cached products to refresh.
+    """
+    # Plain IDs, the log outlives deleted products and categories
+    product_id = models.BigIntegerField(blank=True, null=True)
+    category_id = models.BigIntegerField(blank=True, null=True)
+
+    class Meta:
+        db_table = "CatalogChanges"
+
+    def __str__(self) -> str:
+        return "Change ID: " + str(self.id) + " Product: " + str(self.product_id) + " Category: " + str(self.category_id)
@@ -0,0 +1,146 @@
+import re
+
+from django.db import connection, connections, transaction
+from .catalog import get_catalog
+
+SEARCH_TABLE = "ProductSearch"
+WORD = re.compile(r"\w+")
+
+# Triggers keeping the index in step with the products, as created by the
+# 0012_product_search migration. SQLite drops the triggers of a table that a
+# later migration rebuilds, ensure_search_index puts them back.
+SEARCH_TRIGGERS = {
+    "product_search_insert": """
+    CREATE TRIGGER product_search_insert AFTER INSERT ON Product BEGIN
+        INSERT INTO ProductSearch (rowid, name, description, category)
+        VALUES (new.id, new.name, new.description,
+                COALESCE((SELECT name FROM Category WHERE id = new.category), ''));
+    END
+    """,
+    "product_search_update": """
+    CREATE TRIGGER product_search_update AFTER UPDATE OF name, description, category ON Product BEGIN
+        DELETE FROM ProductSearch WHERE rowid = old.id;
+        INSERT INTO ProductSearch (rowid, name, description, category)
+        VALUES (new.id, new.name, new.description,
+                COALESCE((SELECT name FROM Category WHERE id = new.category), ''));
+    END
+    """,
+    "product_search_delete": """
+    CREATE TRIGGER product_search_delete AFTER DELETE ON Product BEGIN
+        DELETE FROM ProductSearch WHERE rowid = old.id;
+    END
+    """,
+    "product_search_category": """
+    CREATE TRIGGER product_search_category AFTER UPDATE OF name ON Category BEGIN
+        UPDATE ProductSearch SET category = new.name
+        WHERE rowid IN (SELECT id FROM Product WHERE category = new.id);
+    END
+    """,
+}
+
+_search_table_exists = None
+
+
+def search_index_available():
+    """
+    Returns True when the full-text index created by the products migrations
+    exists, which is only the case on SQLite.
+    """
+    global _search_table_exists
+    if _search_table_exists is None:
+        _search_table_exists = connection.vendor == "sqlite" and \
+            SEARCH_TABLE in connection.introspection.table_names()
+    return _search_table_exists
+
+
+def _triggers(cursor):
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def rebuild_search_index(using="default"):
+    """
+    Creates the missing triggers of the full-text index and fills it again
+    from the products, which catches up with the edits made while a trigger
+    was missing.
+
+    Args:
+        using: Alias of the database
+
+    Returns the names of the triggers that were created.
+    """
+    connection = connections[using]
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        existing = _triggers(cursor)
+        missing = [name for name in SEARCH_TRIGGERS if name not in existing]
+        for name in missing:
+            cursor.execute(SEARCH_TRIGGERS[name])
+
+        cursor.execute("DELETE FROM " + SEARCH_TABLE)
+        cursor.execute(
+            "INSERT INTO " + SEARCH_TABLE + " (rowid, name, description, category) "
+            "SELECT Product.id, Product.name, Product.description, COALESCE(Category.name, '') "
+            "FROM Product LEFT JOIN Category ON Category.id = Product.category")
+    return missing
+
+
+def ensure_search_index(using="default"):
+    """
+    Rebuilds the full-text index when one of its triggers is missing. Run
+    after every migrate, does nothing when there is no index.
+
+    Args:
+        using: Alias of the database
+
+    Returns the names of the triggers that were created.
+    """
+    connection = connections[using]
+    if connection.vendor != "sqlite" or \
+            SEARCH_TABLE not in connection.introspection.table_names():
+        return []
+    with connection.cursor() as cursor:
+        existing = _triggers(cursor)
+    if all(name in existing for name in SEARCH_TRIGGERS):
+        return []
+    return rebuild_search_index(using)
+
+
+def match_query(term):
+    """
+    Returns the FTS5 query matching the products that have every word of the
+    term, the last one as a prefix since it is still being typed. None when
+    the term has no words.
+    """
+    words = WORD.findall(term)
+    if not words:
+        return None
+    # Quoted so words like AND or NOT are not read as operators
+    return " ".join('"' + word + '"' + ("*" if index == len(words) - 1 else "")
+                    for index, word in enumerate(words))
+
+
+def search_products(term, limit=10):
+    """
+    Args:
+        term: Text typed in the product autocomplete
+        limit: Largest number of products returned
+
+    Returns the catalog records of the matching products, best matches
+    first: name matches rank above category and description ones.
+    """
+    catalog = get_catalog()
+    if not search_index_available():
+        return catalog.search(term, limit)
+
+    query = match_query(term)
+    if query is None:
+        return []
+    with connection.cursor() as cursor:
+        # The rank is bm25 with the column weights set by the migration
+        cursor.execute(
+            "SELECT rowid FROM " + SEARCH_TABLE + " WHERE " + SEARCH_TABLE +
+            " MATCH %s ORDER BY rank LIMIT %s", [query, limit])
+        ids = [row[0] for row in cursor.fetchall()]
+
+    records = catalog.get_many(ids)
+    return [records[product_id] for product_id in ids if product_id in records]
@@ -0,0 +1,43 @@
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import Signal, receiver
+from .catalog import record_catalog_change
+from .categories import invalidate_category_tree
+from .models import Category, Product, ProductBarcode, SubCategory
+from .search import ensure_search_index
+
+# Sent once products were imported in bulk, after the transaction is
+# committed. Bulk inserts and updates do not send post_save.
+products_changed = Signal()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_changed(sender, instance, **kwargs):
+    record_catalog_change(product_id=instance.id)
+
+
+@receiver(post_save, sender=ProductBarcode)
+@receiver(post_delete, sender=ProductBarcode)
+def barcode_changed(sender, instance, **kwargs):
+    record_catalog_change(product_id=instance.product_id)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, **kwargs):
+    record_catalog_change(category_id=instance.id)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=SubCategory)
+@receiver(post_delete, sender=SubCategory)
+def category_tree_changed(sender, instance, **kwargs):
+    invalidate_category_tree()
+
+
+@receiver(post_migrate)
+def products_migrated(sender, using, **kwargs):
+    # Migrations that rebuild the product tables drop the search triggers
+    if sender.name == "products":
+        ensure_search_index(using)
@@ -0,0 +1,80 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Max, Sum
+from django.utils import timezone
+from .models import Product, StockMovement
+
+
+def current_stock(product_id, lock=False):
+    """
+    Args:
+        product_id: ID of the product
+        lock: Lock the product row until the transaction ends, so no other
+            stock change can be made between this read and the caller's write
+
+    Returns the stock snapshot of the product plus its movement tail.
+    """
+    products = Product.objects.with_current_stock()
+    if lock:
+        products = products.select_for_update()
+    return products.values_list("current_stock", flat=True).get(id=product_id)
+
+
+def adjust_stock(product, new_stock, reference=None):
+    """
+    Records the movement that brings the product stock to new_stock.
+
+    Args:
+        product: The product whose stock was counted
+        new_stock: The stock the product should have from now on
+        reference: Optional text saved with the movement
+    """
+    with transaction.atomic():
+        difference = int(new_stock) - current_stock(product.id, lock=True)
+        if difference:
+            StockMovement.objects.create(
+                product=product,
+                quantity=difference,
+                reason="ADJUSTMENT",
+                reference=reference,
+            )
+    return difference
+
+
+def compact_stock(settle_seconds=60):
+    """
+    Folds the stock movements into the Product.stock snapshots.
+
+    Movements newer than settle_seconds are left in the tail, so rows written
+    by transactions that were still open when the compaction started are
+    never skipped.
+
+    Args:
+        settle_seconds: Age a movement must have to be compacted
+
+    Returns the number of products whose snapshot was updated.
+    """
+    limit = timezone.now() - timedelta(seconds=settle_seconds)
+
+    with transaction.atomic():
+        last_id = StockMovement.objects.filter(
+            date_added__lte=limit).aggregate(last_id=Max("id"))["last_id"]
+        if last_id is None:
+            return 0
+
+        tails = StockMovement.objects.filter(
+            id__gt=F("product__stock_compacted_to"),
+            id__lte=last_id,
+        ).values("product").annotate(total=Sum("quantity")).order_by()
+
+        compacted = 0
+        for tail in tails:
+            compacted += Product.objects.filter(
+                id=tail["product"],
+                stock_compacted_to__lt=last_id,
+            ).update(
+                stock=F("stock") + tail["total"],
+                stock_compacted_to=last_id,
+            )
+    return compacted
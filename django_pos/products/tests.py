@@ -1,3 +1,317 @@
-from django.test import TestCase
+import os
+import tempfile
+from io import StringIO
+from unittest import skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.core.management.sql import emit_post_migrate_signal
+from django.db import connection
+from django.test import override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from pos.testing import POSTestCase
+from .catalog import get_catalog
+from .categories import get_category_tree
+from .importer import import_products
+from .models import Category, Product, ProductBarcode, StockMovement, SubCategory
+from .search import SEARCH_TABLE, match_query, search_products
+from .stock import adjust_stock, compact_stock, current_stock
+
+
+class ProductsTestCase(POSTestCase):
+    """
+    One category with one product with 10 units in stock.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(
+            name="Drinks", description="Drinks", status="ACTIVE")
+        cls.soda = Product.objects.create(
+            name="Soda", description="Sparkling", status="ACTIVE", category=cls.category,
+            price=2, buying_price=1, stock=10)
+
+
+class StockLedgerTests(ProductsTestCase):
+
+    def sell(self, quantity):
+        StockMovement.objects.create(product=self.soda, quantity=-quantity, reason="SALE")
+
+    def test_adjust_stock_records_the_difference(self):
+        self.sell(3)
+        self.assertEqual(adjust_stock(self.soda, 12, reference="Count"), 5)
+        self.assertEqual(current_stock(self.soda.id), 12)
+        self.assertEqual(adjust_stock(self.soda, 12), 0)
+        self.assertEqual(StockMovement.objects.filter(reason="ADJUSTMENT").count(), 1)
+
+    def test_compaction_keeps_the_current_stock(self):
+        self.sell(3)
+        adjust_stock(self.soda, 20)
+        self.sell(4)
+        before = current_stock(self.soda.id)
+
+        self.assertEqual(compact_stock(settle_seconds=0), 1)
+
+        product = Product.objects.get(id=self.soda.id)
+        self.assertEqual(product.stock, before)
+        self.assertEqual(product.stock_compacted_to, StockMovement.objects.latest("id").id)
+        self.assertEqual(current_stock(self.soda.id), before)
+        # Nothing left to fold, the snapshot is not counted twice
+        self.assertEqual(compact_stock(settle_seconds=0), 0)
+        self.assertEqual(current_stock(self.soda.id), before)
+
+    def test_compaction_leaves_recent_movements_in_the_tail(self):
+        self.sell(3)
+        self.assertEqual(compact_stock(settle_seconds=3600), 0)
+        product = Product.objects.get(id=self.soda.id)
+        self.assertEqual(product.stock, 10)
+        self.assertEqual(current_stock(self.soda.id), 7)
+
+    def test_movements_after_compaction_are_counted(self):
+        self.sell(2)
+        compact_stock(settle_seconds=0)
+        self.sell(1)
+        self.assertEqual(current_stock(self.soda.id), 7)
+
+
+class CategoryUpdateTests(ProductsTestCase):
+
+    def test_update_refreshes_the_tree_and_the_catalog(self):
+        self.client.force_login(User.objects.create_user("manager", password="secret"))
+        self.assertEqual(get_category_tree().category(self.category.id).name, "Drinks")
+        self.assertEqual(get_catalog().get_many([self.soda.id])[self.soda.id].category, "Drinks")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                "/products/categories/update/" + str(self.category.id),
+                {"name": "Beverages", "state": "ACTIVE", "description": "Cold drinks"})
+
+        self.assertRedirects(response, "/products/categories", fetch_redirect_response=False)
+        self.assertEqual(get_category_tree().category(self.category.id).name, "Beverages")
+        self.assertEqual(get_catalog().get_many([self.soda.id])[self.soda.id].category, "Beverages")
+
+
+class SaleLookupTests(ProductsTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_user("cashier", password="secret"))
+        ProductBarcode.objects.create(product=self.soda, code="5000112637922")
+
+    def test_scanned_product(self):
+        response = self.client.get("/products/scan", {"code": "5000112637922"})
+        self.assertEqual(response.status_code, 200)
+        item = response.json()
+        self.assertEqual((item["id"], item["text"], item["category"]),
+                         (self.soda.id, "Soda", "Drinks"))
+        # The catalog does not see stock changes, it never reports a stock
+        self.assertNotIn("stock", item)
+
+        self.assertEqual(self.client.get("/products/scan", {"code": "404"}).status_code, 404)
+
+    def test_searched_products(self):
+        response = self.client.post("/products/get", {"term": "sod"},
+                                    HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+        self.assertEqual([item["id"] for item in response.json()], [self.soda.id])
+        self.assertNotIn("stock", response.json()[0])
+
+    def test_product_json_has_no_stock(self):
+        item = self.soda.to_json()
+        self.assertEqual((item["id"], item["text"], item["category"]),
+                         (self.soda.id, "Soda", "Drinks"))
+        # Only the compacted snapshot, it would be out of date
+        self.assertNotIn("stock", item)
+        self.assertNotIn("stock_compacted_to", item)
+
+
+@skipUnless(connection.vendor == "sqlite", "The full-text index only exists on SQLite")
+class ProductSearchTests(ProductsTestCase):
+
+    def matches(self, term):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT rowid FROM " + SEARCH_TABLE + " WHERE " + SEARCH_TABLE +
+                           " MATCH %s", [match_query(term)])
+            return [row[0] for row in cursor.fetchall()]
+
+    def drop_trigger(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TRIGGER " + name)
+
+    def test_search_ranks_name_matches_first(self):
+        Product.objects.create(
+            name="Juice", description="Not a soda", status="ACTIVE", category=self.category,
+            price=3)
+        self.assertEqual([product.name for product in search_products("sod")], ["Soda", "Juice"])
+
+    def test_index_follows_product_edits(self):
+        water = Product.objects.create(
+            name="Water", description="Still", status="ACTIVE", category=self.category, price=1)
+        self.assertEqual(self.matches("wat"), [water.id])
+
+        water.name = "Mineral water"
+        water.save()
+        self.assertEqual(self.matches("mineral"), [water.id])
+
+        water.delete()
+        self.assertEqual(self.matches("wat"), [])
+
+    def test_index_follows_category_renames(self):
+        self.category.name = "Beverages"
+        self.category.save()
+        self.assertEqual(self.matches("bever"), [self.soda.id])
+        self.assertEqual(self.matches("drinks"), [])
+
+    def test_missing_triggers_are_created_after_migrate(self):
+        # As left by a migration that rebuilt the product table
+        self.drop_trigger("product_search_update")
+        Product.objects.filter(id=self.soda.id).update(name="Cola")
+        self.assertEqual(self.matches("cola"), [])
+
+        emit_post_migrate_signal(verbosity=0, interactive=False, db="default")
+
+        self.assertEqual(self.matches("cola"), [self.soda.id])
+        Product.objects.filter(id=self.soda.id).update(name="Lemonade")
+        self.assertEqual(self.matches("lemon"), [self.soda.id])
+
+    def test_rebuild_command(self):
+        self.drop_trigger("product_search_insert")
+        water = Product.objects.create(
+            name="Water", description="Still", status="ACTIVE", category=self.category, price=1)
+        self.assertEqual(self.matches("water"), [])
+
+        out = StringIO()
+        call_command("rebuild_product_search", stdout=out)
+
+        self.assertIn("product_search_insert", out.getvalue())
+        self.assertEqual(self.matches("water"), [water.id])
+        self.assertEqual(self.matches("soda"), [self.soda.id])
+
+
+class ProductImportTests(ProductsTestCase):
+    header = "sku,name,description,category,subcategory,price,buying_price,stock,status\n"
+
+    def import_rows(self, *rows, **options):
+        return import_products(StringIO(self.header + "".join(row + "\n" for row in rows)),
+                               **options)
+
+    def test_creates_and_updates_products(self):
+        report = self.import_rows(
+            "SODA-1,Soda,Fizzy,drinks,,2.5,,12,",
+            "CHIPS-1,Chips,Salted,Snacks,Crisps,1.5,1,30,inactive",
+        )
+        self.assertEqual(report, {"created": 1, "updated": 1, "categories": 2, "errors": []})
+
+        # Matched by name, the SKU is added and the counted stock adjusted
+        soda = Product.objects.get(id=self.soda.id)
+        self.assertEqual((soda.description, soda.price, soda.buying_price), ("Fizzy", 2.5, 1))
+        self.assertEqual(list(soda.barcodes.values_list("code", flat=True)), ["SODA-1"])
+        self.assertEqual(current_stock(soda.id), 12)
+        self.assertEqual(StockMovement.objects.get().quantity, 2)
+
+        chips = Product.objects.get(barcodes__code="CHIPS-1")
+        self.assertEqual((chips.status, chips.stock, chips.category.name, chips.subcategory.name),
+                         ("INACTIVE", 30, "Snacks", "Crisps"))
+        self.assertEqual(SubCategory.objects.get().category, chips.category)
+
+        # Matched by SKU from now on, whatever the name
+        report = self.import_rows("SODA-1,Cola,Fizzy,Drinks,,,,12,")
+        self.assertEqual((report["created"], report["updated"]), (0, 1))
+        self.assertEqual(Product.objects.get(id=self.soda.id).name, "Cola")
+        self.assertEqual(StockMovement.objects.count(), 1)
+
+    def test_reports_invalid_rows_by_line(self):
+        Product.objects.create(name="Twin", description="", category=self.category, price=1)
+        Product.objects.create(name="Twin", description="", category=self.category, price=1)
+        report = self.import_rows(
+            ",,,Drinks,,1,,,",
+            "X1,Bad price,,Drinks,,abc,,,",
+            "X2,Bad stock,,Drinks,,1,,-3,",
+            "X3,Bad status,,Drinks,,1,,,sold",
+            "X4,No price,,Drinks,,,,,",
+            "X5,Twin,,Drinks,,2,,,",
+            "X6,Good,,Drinks,,2,,,",
+        )
+        self.assertEqual(report["errors"], [
+            {"line": 2, "error": "Missing name"},
+            {"line": 3, "error": "Invalid price: abc"},
+            {"line": 4, "error": "Negative stock: -3"},
+            {"line": 5, "error": "Invalid status: SOLD"},
+            {"line": 6, "error": "Missing price"},
+            {"line": 7, "error": "Several products named Twin"},
+        ])
+        self.assertEqual(report["created"], 1)
+        self.assertEqual(Product.objects.count(), 4)
+
+    def test_repeated_products_are_imported_once(self):
+        for chunk_size in (100, 1):
+            ProductBarcode.objects.all().delete()
+            Product.objects.exclude(id=self.soda.id).delete()
+            report = self.import_rows(
+                "A1,Apple,,Fruit,,1,,,",
+                "A1,Apricot,,Fruit,,1,,,",
+                ",Apple,,Fruit,,1,,,",
+                "S1,Soda,,Drinks,,2,,,",
+                "S2,Soda,,Drinks,,2,,,",
+                chunk_size=chunk_size)
+            self.assertEqual(report["errors"], [
+                {"line": 3, "error": "Same product as line 2"},
+                {"line": 4, "error": "Same product as line 2"},
+                {"line": 6, "error": "Same product as line 5"},
+            ], chunk_size)
+            self.assertEqual(Product.objects.filter(name="Apple").count(), 1)
+            self.assertEqual(list(Product.objects.get(id=self.soda.id).barcodes.values_list(
+                "code", flat=True)), ["S1"])
+
+    def test_same_file_twice_writes_nothing(self):
+        rows = ("SODA-1,Soda,Fizzy,Drinks,,2.5,,12,", "C1,Chips,,Snacks,,1.5,,30,")
+        self.import_rows(*rows)
+        with CaptureQueriesContext(connection) as queries:
+            report = self.import_rows(*rows)
+
+        self.assertEqual((report["created"], report["updated"], report["categories"]), (0, 2, 0))
+        writes = [query["sql"] for query in queries.captured_queries
+                  if query["sql"].startswith(("INSERT", "UPDATE", "DELETE"))
+                  and "CatalogChange" not in query["sql"]]
+        self.assertEqual(writes, [])
+
+    def test_missing_columns(self):
+        with self.assertRaisesMessage(ValueError, "Missing columns: category"):
+            import_products(StringIO("name,price\nSoda,2\n"))
+
+    def test_not_a_csv_file(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "products.csv")
+        with open(path, "w") as f:
+            f.write("name,category\n" + "x" * 200000 + ",Drinks\n")
+        with self.assertRaisesMessage(CommandError, "field larger than field limit"):
+            call_command("import_products", path)
+
+    @skipUnlessDBFeature("has_select_for_update")
+    def test_products_are_locked_while_the_stock_is_adjusted(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.import_rows(",Soda,,Drinks,,,,3,")
+        stock_reads = [query["sql"] for query in queries.captured_queries
+                       if "current_stock" in query["sql"]]
+        self.assertTrue(stock_reads)
+        self.assertTrue(all("FOR UPDATE" in sql for sql in stock_reads))
+
+    @override_settings(
+        STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage")
+    def test_upload(self):
+        self.client.force_login(User.objects.create_user("manager", password="secret"))
+        upload = SimpleUploadedFile("products.csv", (
+            "\ufeffname,category,price\nChips,Snacks,1.5\nBroken,Snacks,x\n").encode("utf-8"))
+
+        response = self.client.post("/products/import", {"file": upload})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["report"]["errors"],
+                         [{"line": 3, "error": "Invalid price: x"}])
+        self.assertTrue(Product.objects.filter(name="Chips").exists())
+
+        for content in (b"foo,bar\n1,2\n", b"name,category\n" + b"x" * 200000 + b",Drinks\n"):
+            response = self.client.post("/products/import", {
+                "file": SimpleUploadedFile("products.csv", content)})
+            self.assertRedirects(response, "/products/import", fetch_redirect_response=False)
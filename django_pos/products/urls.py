@@ -29,8 +29,12 @@ urlpatterns = [
           
     # List products
     path('', views.products_list_view, name='products_list'),
+    # Pages of the products list for DataTables
+    path('data', views.products_data_view, name='products_data'),
     # Add product
     path('add', views.products_add_view, name='products_add'),
+    # Import products from a CSV file
+    path('import', views.products_import_view, name='products_import'),
     # Update product
     path('update/<str:product_id>',
          views.products_update_view, name='products_update'),
@@ -39,4 +43,6 @@ urlpatterns = [
          views.products_delete_view, name='products_delete'),
     # Get products AJAX
     path("get", views.get_products_ajax_view, name="get_products"),
+    # Product of a scanned barcode
+    path("scan", views.scan_product_view, name="scan_product"),
 ]
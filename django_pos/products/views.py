@@ -1,8 +1,19 @@
+import csv
+import io
+
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
+from django.db import transaction
 from django.shortcuts import render, redirect
-from .models import Category, Product,SubCategory
+from django.views.decorators.http import require_GET
+from .catalog import lookup_barcode
+from .categories import get_category_tree
+from .importer import IMPORT_COLUMNS, import_products
+from .listing import product_page
+from .models import Category, Product, StockMovement, SubCategory
+from .search import search_products
+from .stock import adjust_stock
 
 
 @login_required(login_url="/accounts/login/")
@@ -97,11 +108,11 @@ def categories_update_view(request, category_id):
                                extra_tags="warning")
                 return redirect('products:categories_add')
 
-            # Get the category to update
-            category = Category.objects.filter(
-                id=category_id).update(**attributes)
-
-            category = Category.objects.get(id=category_id)
+            # Saved through the model, the signals refresh the category tree
+            # and the catalog of every worker
+            for field, value in attributes.items():
+                setattr(category, field, value)
+            category.save()
 
             messages.success(request, '¡Category: ' + category.name +
                              ' updated successfully!', extra_tags="success")
@@ -140,7 +151,7 @@ def categories_delete_view(request, category_id):
 def subcategories_list_view(request):
     context = {
         "active_icon": "products_categories",
-        "subcategories": SubCategory.objects.all()
+        "subcategories": get_category_tree().subcategories
     }
     return render(request, "products/subcategories.html", context=context)
 
@@ -149,7 +160,7 @@ def subcategories_list_view(request):
 def subcategories_add_view(request):
     context = {
         "active_icon": "products_categories",
-        "categories": Category.objects.all(),  # Fetch all categories
+        "categories": get_category_tree().categories,
     }
 
     if request.method == 'POST':
@@ -187,7 +198,7 @@ def subcategories_update_view(request, subcategory_id):
         messages.error(request, 'Subcategory does not exist!', extra_tags="danger")
         return redirect('products:subcategories_list')
 
-    categories = Category.objects.all()  # Retrieve all categories for the dropdown
+    categories = get_category_tree().categories  # For the dropdown
 
     if request.method == 'POST':
         category_id = request.POST.get('category')
@@ -238,45 +249,50 @@ def products_list_view(request):
     if request.method == "POST" and "sale" in request.POST:
         product_id = request.POST.get("product_id")
         quantity_sold = int(request.POST.get("quantity_sold"))
-        product = Product.objects.get(id=product_id)
-        if product.stock >= quantity_sold:
-            # Update product stock
-            product.stock -= quantity_sold
-            product.save()
-            # Here you might want to add additional logic for sales recording, such as updating total sales, etc.
-        else:
-            # Handle insufficient stock situation, you can redirect or render an error message
-            return render(request, "error.html", {"message": "Insufficient stock!"})
+        with transaction.atomic():
+            # Locked so another sale can not take the same units meanwhile,
+            # sales of this product wait for the commit like in checkout
+            product = Product.objects.with_current_stock().select_for_update().get(id=product_id)
+            if product.current_stock >= quantity_sold:
+                # Take the units out of stock through the ledger
+                StockMovement.objects.create(
+                    product=product, quantity=-quantity_sold, reason="SALE")
+                # Here you might want to add additional logic for sales recording, such as updating total sales, etc.
+            else:
+                # Handle insufficient stock situation, you can redirect or render an error message
+                return render(request, "error.html", {"message": "Insufficient stock!"})
         return redirect("products_list")  # Redirect back to the products list page
     else:
-        products = Product.objects.all()
-        subcategories = SubCategory.objects.all()  # Fetch all subcategories for filtering
-        search_query = request.GET.get('search')
-        subcategory_filter = request.GET.get('subcategory_filter')
-        
-        if search_query:
-            products = products.filter(name__icontains=search_query)
-        
-        if subcategory_filter:
-            products = products.filter(subcategory__id=subcategory_filter)
-        
+        # Rows are loaded page by page by products_data_view
         context = {
             "active_icon": "products",
-            "products": products,
-            "subcategories": subcategories,
-            "selected_subcategory": subcategory_filter  # Added for highlighting selected subcategory in the dropdown
+            "subcategories": get_category_tree().subcategories,  # For filtering
+            "product_status": Product.STATUS_CHOICES,
         }
         return render(request, "products/products.html", context=context)
 
 
 
+@login_required(login_url="/accounts/login/")
+@require_GET
+def products_data_view(request):
+    """
+    Args:
+        request: GET sent by DataTables server-side processing
+    Returns one page of the products table as JSON.
+    """
+    try:
+        return JsonResponse(product_page(request.GET))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+
 @login_required(login_url="/accounts/login/")
 def products_add_view(request):
-    categories = Category.objects.filter(status="ACTIVE").prefetch_related('subcategories')  # Fetch categories with subcategories
     context = {
         "active_icon": "products_categories",
         "product_status": Product.STATUS_CHOICES,
-        "categories": categories
+        "categories": get_category_tree().active_categories
     }
 
     if request.method == 'POST':
@@ -318,21 +334,56 @@ def products_add_view(request):
     return render(request, "products/products_add.html", context=context)
 
 
+@login_required(login_url="/accounts/login/")
+def products_import_view(request):
+    """
+    Args:
+        request: GET for the upload form, POST with the CSV "file"
+    Imports the products of the uploaded CSV and shows the rows that failed.
+    """
+    context = {
+        "active_icon": "products",
+        "columns": IMPORT_COLUMNS,
+    }
+
+    if request.method == 'POST':
+        upload = request.FILES.get('file')
+        if upload is None:
+            messages.error(request, 'Select a CSV file to import!', extra_tags="warning")
+            return redirect('products:products_import')
+
+        try:
+            # Decoded while it is read, the file is never loaded at once
+            lines = io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+            report = import_products(lines)
+        except (UnicodeDecodeError, ValueError, csv.Error) as e:
+            messages.error(request, 'The file could not be imported: ' + str(e), extra_tags="danger")
+            return redirect('products:products_import')
+
+        messages.success(request, 'Created ' + str(report["created"]) + ' products and updated ' +
+                         str(report["updated"]) + '!', extra_tags="success")
+        context["report"] = report
+
+    return render(request, "products/products_import.html", context=context)
+
+
 @login_required(login_url="/accounts/login/")
 def products_update_view(request, product_id):
     try:
-        product = Product.objects.get(id=product_id)
+        product = Product.objects.with_current_stock().get(id=product_id)
     except Exception as e:
         messages.success(request, 'There was an error trying to get the product!', extra_tags="danger")
         print(e)
         return redirect('products:products_list')
 
-    categories = Category.objects.all().prefetch_related('subcategories')
+    tree = get_category_tree()
+    category = tree.category(product.category_id)
     context = {
         "active_icon": "products",
         "product_status": Product.STATUS_CHOICES,
         "product": product,
-        "categories": categories
+        "categories": tree.categories,
+        "subcategories": category.subcategories if category else [],
     }
 
     if request.method == 'POST':
@@ -348,7 +399,6 @@ def products_update_view(request, product_id):
                 "category": Category.objects.get(id=category_id),
                 "price": data['price'],
                 "buying_price": data['buying_price'],  # Include buying price here
-                "stock": data['stock']  # Include stock count here
             }
 
             if subcategory_id:
@@ -358,7 +408,13 @@ def products_update_view(request, product_id):
                 messages.error(request, 'Product already exists!', extra_tags="warning")
                 return redirect('products:products_add')
 
-            Product.objects.filter(id=product_id).update(**attributes)
+            with transaction.atomic():
+                for field, value in attributes.items():
+                    setattr(product, field, value)
+                # Saved through the model so listeners see the change
+                product.save(update_fields=list(attributes))
+                # The counted stock is recorded as an adjustment in the ledger
+                adjust_stock(product, data['stock'], reference="Product update")
 
             messages.success(request, 'Product: ' + product.name + ' updated successfully!', extra_tags="success")
             return redirect('products:products_list')
@@ -401,10 +457,23 @@ def get_products_ajax_view(request):
         if is_ajax(request=request):
             data = []
 
-            products = Product.objects.filter(
-                name__icontains=request.POST['term'])
-            for product in products[0:10]:
+            # Ranked full-text search, read from the worker's catalog
+            for product in search_products(request.POST['term'], limit=10):
                 item = product.to_json()
                 data.append(item)
 
             return JsonResponse(data, safe=False)
+
+
+@login_required(login_url="/accounts/login/")
+@require_GET
+def scan_product_view(request):
+    """
+    Args:
+        request: GET with the scanned "code"
+    Returns the product with that barcode as JSON, 404 when there is none.
+    """
+    item = lookup_barcode(request.GET.get("code", "").strip())
+    if item is None:
+        return JsonResponse({"error": "Unknown barcode"}, status=404)
+    return JsonResponse(item)
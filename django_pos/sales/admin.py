@@ -1,6 +1,7 @@
 from django.contrib import admin
 
-from .models import Sale, SaleDetail
+from .models import DailyProductSales, Sale, SaleDetail
 
 admin.site.register(Sale)
 admin.site.register(SaleDetail)
+admin.site.register(DailyProductSales)
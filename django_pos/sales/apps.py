@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class SalesConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "sales"
+
+    def ready(self):
+        # Keep the daily summary and leaderboard in step with deleted sales
+        from . import signals  # noqa: F401
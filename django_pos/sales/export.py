@@ -0,0 +1,90 @@
+import os
+import zipfile
+
+from django.db.models import Prefetch
+from .models import SaleDetail
+from .receipts import get_render_context, receipt_path, render_receipt
+from .summary import sales_in_period
+
+# Sales fetched per batch, each batch costs two queries
+EXPORT_CHUNK_SIZE = 200
+# A merged PDF is laid out in memory, bigger exports must use the ZIP format
+EXPORT_PDF_MAX_SALES = 500
+
+
+def export_sales(start, end):
+    """
+    Args:
+        start: Aware datetime, first moment included
+        end: Aware datetime, first moment excluded
+
+    Returns an iterator over the sales of the period with their customer and
+    details loaded, fetched in chunks.
+    """
+    return sales_in_period(start, end).select_related("customer").prefetch_related(
+        Prefetch("saledetail_set",
+                 queryset=SaleDetail.objects.select_related("product"))
+    ).order_by("id").iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+class _ZipStream:
+    """
+    Write-only file object that hands the written bytes over to the response
+    instead of keeping the whole archive.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_receipts_zip(sales):
+    """
+    Yields a ZIP archive with one receipt PDF per sale, chunk by chunk.
+    Receipts already in the cache are copied from disk instead of rendered.
+    """
+    stream = _ZipStream()
+    # PDFs are already compressed, storing them is just as small and faster
+    with zipfile.ZipFile(stream, mode="w", compression=zipfile.ZIP_STORED) as archive:
+        for sale in sales:
+            name = "receipt_" + str(sale.id) + ".pdf"
+            path = receipt_path(sale.id)
+            if os.path.exists(path):
+                archive.write(path, arcname=name)
+            else:
+                archive.writestr(name, render_receipt(
+                    sale, sale.saledetail_set.all()))
+            yield stream.pop()
+    yield stream.pop()
+
+
+def render_receipts_pdf(sales):
+    """
+    Returns one PDF with the receipts of all the sales, one after the other.
+    """
+    render_context = get_render_context()
+    pages = []
+    first = None
+    for sale in sales:
+        document = render_context.document({
+            "sale": sale,
+            "details": sale.saledetail_set.all(),
+        })
+        if first is None:
+            first = document
+        pages.extend(document.pages)
+
+    if first is None:
+        return None
+    return first.copy(pages).write_pdf()
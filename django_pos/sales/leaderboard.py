@@ -0,0 +1,128 @@
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .models import DailyProductSales, SaleDetail
+
+# Days covered by each leaderboard window, None meaning all time
+LEADERBOARD_WINDOWS = {
+    "today": 1,
+    "week": 7,
+    "month": 30,
+    "all": None,
+}
+
+
+def add_to_leaderboard(sold):
+    """
+    Adds the units sold to the daily product buckets. Meant to run inside the
+    transaction that creates the sales, like add_to_daily_summary.
+
+    Args:
+        sold: Iterable of (sale, lines) with the lines parsed by parse_cart
+    """
+    units = {}
+    for sale, lines in sold:
+        day = timezone.localdate(sale.date_added)
+        for line in lines:
+            key = (day, line["product_id"])
+            units[key] = units.get(key, 0) + line["quantity"]
+    if not units:
+        return
+
+    existing = {}
+    buckets = DailyProductSales.objects.filter(
+        date__in={day for day, _ in units},
+        product_id__in={product_id for _, product_id in units},
+    )
+    for bucket in buckets:
+        key = (bucket.date, bucket.product_id)
+        if key in units:
+            bucket.units = F("units") + units[key]
+            existing[key] = bucket
+    DailyProductSales.objects.bulk_update(existing.values(), ["units"])
+
+    missing = [
+        DailyProductSales(date=day, product_id=product_id, units=quantity)
+        for (day, product_id), quantity in sorted(units.items())
+        if (day, product_id) not in existing
+    ]
+    try:
+        # First sale of these products today
+        with transaction.atomic():
+            DailyProductSales.objects.bulk_create(missing)
+    except IntegrityError:
+        # Another till created some of the buckets in the meantime
+        for bucket in missing:
+            if not DailyProductSales.objects.filter(
+                    date=bucket.date, product_id=bucket.product_id
+            ).update(units=F("units") + bucket.units):
+                bucket.save()
+
+
+def remove_from_leaderboard(sale):
+    """
+    Subtracts the units of a sale from the daily product buckets, the
+    opposite of add_to_leaderboard. Meant to run inside the transaction that
+    deletes the sale, before its details are deleted.
+    """
+    buckets = DailyProductSales.objects.filter(date=timezone.localdate(sale.date_added))
+    units = SaleDetail.objects.filter(sale=sale).values("product").annotate(
+        units=Sum("quantity")).order_by().values_list("product", "units")
+    for product_id, quantity in units:
+        buckets.filter(product_id=product_id).update(units=F("units") - quantity)
+    # Like the rebuild, products not sold that day have no bucket
+    buckets.filter(units__lte=0).delete()
+
+
+def top_sellers(window="all", limit=3):
+    """
+    Args:
+        window: One of LEADERBOARD_WINDOWS
+        limit: Number of products returned
+
+    Returns the best selling products of the window as dicts with their
+    "id", "name" and "quantity", best first.
+    """
+    if window not in LEADERBOARD_WINDOWS:
+        raise ValueError("Invalid window: " + str(window))
+
+    buckets = DailyProductSales.objects.all()
+    days = LEADERBOARD_WINDOWS[window]
+    if days is not None:
+        buckets = buckets.filter(
+            date__gt=timezone.localdate() - timedelta(days=days))
+
+    rows = buckets.values("product").annotate(
+        quantity=Sum("units")
+    ).order_by("-quantity", "product").values_list(
+        "product", "product__name", "quantity")[:limit]
+    return [{"id": product_id, "name": name, "quantity": quantity}
+            for product_id, name, quantity in rows]
+
+
+def rebuild_leaderboard():
+    """
+    Recomputes every daily product bucket from the sale details.
+
+    Returns the number of buckets.
+    """
+    tz = timezone.get_current_timezone()
+
+    with transaction.atomic():
+        # Deleting first takes the write lock, so no sale is missed meanwhile
+        DailyProductSales.objects.all().delete()
+
+        rows = SaleDetail.objects.annotate(
+            day=TruncDate("sale__date_added", tzinfo=tz)
+        ).values("day", "product").annotate(
+            units=Sum("quantity")
+        ).order_by()
+        buckets = DailyProductSales.objects.bulk_create([
+            DailyProductSales(
+                date=row["day"], product_id=row["product"], units=row["units"])
+            for row in rows
+        ], batch_size=500)
+    return len(buckets)
@@ -0,0 +1,105 @@
+from django.db.models import Q, Value
+from django.db.models.functions import Coalesce
+from django.urls import reverse
+from django.utils import formats, timezone
+from django.utils.dateparse import parse_date
+from pos.pagination import table_page
+from .models import Sale
+from .summary import local_period
+
+# Largest page served, DataTables asks for -1 when "All" is selected
+SALES_PAGE_MAX = 100
+
+# Order fields of each sortable column of the sales table, the ID breaks ties.
+# None can not be compared in a cursor, nullable fields are sorted through a
+# non-null annotation
+SALES_ORDER_COLUMNS = {
+    1: ["id"],
+    2: ["date_added", "id"],
+    3: ["customer__first_name", "customer_last_name", "id"],
+    4: ["grand_total", "id"],
+    5: ["item_count", "id"],
+}
+SALES_DEFAULT_COLUMN = 2
+
+
+def filter_sales(sales, search="", min_date=None, max_date=None):
+    """
+    Args:
+        sales: Queryset of sales to filter
+        search: Words that must each match the sale ID or the customer name
+        min_date: First local day included, None for no limit
+        max_date: Last local day included, None for no limit
+    """
+    if min_date is not None:
+        sales = sales.filter(date_added__gte=local_period(min_date, min_date)[0])
+    if max_date is not None:
+        sales = sales.filter(date_added__lt=local_period(max_date, max_date)[1])
+    for word in search.split():
+        condition = Q(customer__first_name__icontains=word) | \
+            Q(customer__last_name__icontains=word)
+        if word.isdigit():
+            condition |= Q(id=int(word))
+        sales = sales.filter(condition)
+    return sales
+
+
+def _parse_day(value):
+    if not value:
+        return None
+    day = parse_date(value)
+    if day is None:
+        raise ValueError("Invalid date: " + value)
+    return day
+
+
+def sales_page(params):
+    """
+    Serves one page of the sales table to DataTables server-side processing.
+
+    A page costs at most three queries, however many sales there are, and
+    the next and previous pages are fetched by keyset (see table_page).
+
+    Args:
+        params: The GET parameters sent by DataTables, plus the optional
+            "min_date" and "max_date" days and "after" or "before" cursors
+
+    Returns the DataTables response as a dict.
+    """
+    search = params.get("search[value]", "").strip()
+    min_date = _parse_day(params.get("min_date"))
+    max_date = _parse_day(params.get("max_date"))
+
+    records_total = Sale.objects.count()
+    sales = filter_sales(Sale.objects.all(), search, min_date, max_date)
+    if search or min_date or max_date:
+        records_filtered = sales.count()
+    else:
+        records_filtered = records_total
+
+    rows, start, cursors = table_page(
+        sales.select_related("customer").annotate(
+            customer_last_name=Coalesce("customer__last_name", Value(""))), params, SALES_ORDER_COLUMNS,
+        SALES_DEFAULT_COLUMN, default_descending=True, max_length=SALES_PAGE_MAX)
+
+    data = []
+    for number, sale in enumerate(rows, start + 1):
+        data.append({
+            "number": number,
+            "id": sale.id,
+            "date": formats.date_format(
+                timezone.localtime(sale.date_added), "DATETIME_FORMAT"),
+            "customer": sale.customer.get_full_name(),
+            "total": sale.grand_total,
+            "items": sale.item_count,
+            "details_url": reverse("sales:sales_details", args=[sale.id]),
+            "receipt_url": reverse("sales:sales_receipt_pdf", args=[sale.id]),
+        })
+
+    return {
+        "draw": int(params.get("draw", 0)),
+        "recordsTotal": records_total,
+        "recordsFiltered": records_filtered,
+        "data": data,
+        "cursors": cursors,
+    }
@@ -0,0 +1,58 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.template.loader import get_template
+from weasyprint import HTML, CSS
+from sales.models import Sale, SaleDetail
+from sales.receipts import RECEIPT_STYLESHEET, RECEIPT_TEMPLATE, get_render_context
+
+
+class Command(BaseCommand):
+    help = "Measures receipt PDF renders per second with and without the shared render context"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sale", type=int,
+                            help="ID of the sale to render, the latest one by default")
+        parser.add_argument("--renders", type=int, default=20,
+                            help="Number of renders for each measurement")
+
+    def handle(self, *args, **options):
+        sales = Sale.objects.select_related("customer").order_by("-id")
+        if options["sale"]:
+            sales = sales.filter(id=options["sale"])
+        sale = sales.first()
+        if sale is None:
+            raise CommandError("There are no sales to render")
+
+        context = {
+            "sale": sale,
+            "details": list(SaleDetail.objects.filter(sale=sale).select_related("product")),
+        }
+        renders = options["renders"]
+
+        def uncached():
+            # What every receipt cost before: full stylesheet and fonts each time
+            html_template = get_template(RECEIPT_TEMPLATE).render(context)
+            HTML(string=html_template).write_pdf(
+                stylesheets=[CSS(RECEIPT_STYLESHEET)])
+
+        def cached():
+            get_render_context().render(context)
+
+        # Warm up both paths so imports and the first parse are not measured
+        uncached()
+        cached()
+
+        results = {}
+        for name, render in (("before", uncached), ("after", cached)):
+            start = time.perf_counter()
+            for _ in range(renders):
+                render()
+            elapsed = time.perf_counter() - start
+            results[name] = renders / elapsed
+            self.stdout.write(
+                "{}: {:.2f} renders/s ({:.1f} ms per receipt)".format(
+                    name, results[name], 1000 * elapsed / renders))
+
+        self.stdout.write(self.style.SUCCESS(
+            "Speedup: {:.2f}x".format(results["after"] / results["before"])))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from sales.summary import check_sale_counts
+
+
+class Command(BaseCommand):
+    help = "Verifies the item and line counts saved on the sales against their details"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fix", action="store_true",
+                            help="Save the counts computed from the details")
+
+    def handle(self, *args, **options):
+        wrong = check_sale_counts(fix=options["fix"])
+        if not wrong:
+            self.stdout.write(self.style.SUCCESS("The counts of every sale are right"))
+            return
+
+        ids = ", ".join(str(sale_id) for sale_id in wrong)
+        if options["fix"]:
+            self.stdout.write(self.style.SUCCESS(
+                "Fixed the counts of " + str(len(wrong)) + " sales: " + ids))
+        else:
+            raise CommandError(
+                "Wrong counts on " + str(len(wrong)) + " sales: " + ids)
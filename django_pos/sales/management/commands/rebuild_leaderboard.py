@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from sales.leaderboard import rebuild_leaderboard
+from sales.models import Sale
+from sales.signals import sales_changed
+
+
+class Command(BaseCommand):
+    help = "Recomputes the top sellers leaderboard from all the sale details"
+
+    def handle(self, *args, **options):
+        buckets = rebuild_leaderboard()
+        sales_changed.send(sender=Sale)
+        self.stdout.write(self.style.SUCCESS(
+            "Rebuilt the leaderboard with " + str(buckets) + " daily product buckets"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from sales.models import Sale
+from sales.signals import sales_changed
+from sales.summary import rebuild_daily_summary
+
+
+class Command(BaseCommand):
+    help = "Recomputes the daily sales summary used by the dashboard from all the sales"
+
+    def handle(self, *args, **options):
+        days = rebuild_daily_summary()
+        sales_changed.send(sender=Sale)
+        self.stdout.write(self.style.SUCCESS(
+            "Rebuilt the sales summary of " + str(days) + " days"))
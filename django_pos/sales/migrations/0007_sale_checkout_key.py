@@ -0,0 +1,18 @@
+# Generated by Django 4.1.5 on 2026-10-18 06:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0006_alter_saledetail_sale'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sale',
+            name='checkout_key',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 4.1.5 on 2026-10-18 07:01
+
+from django.db import migrations, models
+from django.db.models import Count, F, FloatField, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+
+def backfill_summary(apps, schema_editor):
+    # Same days the rebuild_sales_summary command computes. Details have no
+    # cost snapshot yet, the buying price the product has today is used, as
+    # 0009 does for the unit cost
+    Sale = apps.get_model('sales', 'Sale')
+    SaleDetail = apps.get_model('sales', 'SaleDetail')
+    DailySalesSummary = apps.get_model('sales', 'DailySalesSummary')
+    tz = timezone.get_current_timezone()
+
+    days = {}
+    sales = Sale.objects.annotate(
+        day=TruncDate('date_added', tzinfo=tz)
+    ).values('day').annotate(
+        revenue=Sum('grand_total'), payed=Sum('amount_payed'), sale_count=Count('id'),
+    ).order_by()
+    for row in sales:
+        days[row['day']] = DailySalesSummary(
+            date=row['day'], revenue=row['revenue'] or 0, profit=row['payed'] or 0,
+            sale_count=row['sale_count'])
+
+    details = SaleDetail.objects.annotate(
+        day=TruncDate('sale__date_added', tzinfo=tz)
+    ).values('day').annotate(
+        units=Sum('quantity'),
+        cost=Sum(F('quantity') * Coalesce(F('product__buying_price'), 0.0),
+                 output_field=FloatField()),
+    ).order_by()
+    for row in details:
+        summary = days[row['day']]
+        summary.units = row['units'] or 0
+        summary.cost = row['cost'] or 0
+        summary.profit -= summary.cost
+
+    DailySalesSummary.objects.bulk_create(days.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_product_buying_price'),
+        ('sales', '0007_sale_checkout_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('revenue', models.FloatField(default=0)),
+                ('cost', models.FloatField(default=0)),
+                ('profit', models.FloatField(default=0)),
+                ('units', models.IntegerField(default=0)),
+                ('sale_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'Daily sales summaries',
+                'db_table': 'DailySalesSummaries',
+            },
+        ),
+        migrations.RunPython(backfill_summary, migrations.RunPython.noop),
+    ]
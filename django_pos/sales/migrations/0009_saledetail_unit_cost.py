@@ -0,0 +1,32 @@
+# Generated by Django 4.1.5 on 2026-10-18 07:02
+
+from django.db import migrations, models
+from django.db.models import FloatField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_unit_cost(apps, schema_editor):
+    # Best guess for past sales: the buying price the product has today. The
+    # product of a detail may be gone, its cost is left at 0 then
+    Product = apps.get_model('products', 'Product')
+    SaleDetail = apps.get_model('sales', 'SaleDetail')
+    SaleDetail.objects.update(unit_cost=Coalesce(
+        Subquery(Product.objects.filter(id=OuterRef('product')).values('buying_price')[:1]),
+        Value(0.0), output_field=FloatField()))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_stockmovement'),
+        ('sales', '0008_dailysalessummary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='saledetail',
+            name='unit_cost',
+            field=models.FloatField(default=0),
+        ),
+        migrations.RunPython(backfill_unit_cost, migrations.RunPython.noop),
+    ]
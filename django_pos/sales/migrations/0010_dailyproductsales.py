@@ -0,0 +1,46 @@
+# Generated by Django 4.1.5 on 2026-10-18 07:07
+
+from django.db import migrations, models
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+import django.db.models.deletion
+
+
+def backfill_leaderboard(apps, schema_editor):
+    # Same buckets the rebuild_leaderboard command computes
+    SaleDetail = apps.get_model('sales', 'SaleDetail')
+    DailyProductSales = apps.get_model('sales', 'DailyProductSales')
+    rows = SaleDetail.objects.annotate(
+        day=TruncDate('sale__date_added', tzinfo=timezone.get_current_timezone())
+    ).values('day', 'product').annotate(units=Sum('quantity')).order_by()
+    DailyProductSales.objects.bulk_create([
+        DailyProductSales(date=row['day'], product_id=row['product'], units=row['units'])
+        for row in rows
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_stockmovement'),
+        ('sales', '0009_saledetail_unit_cost'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('units', models.IntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='products.product')),
+            ],
+            options={
+                'verbose_name_plural': 'Daily product sales',
+                'db_table': 'DailyProductSales',
+                'unique_together': {('date', 'product')},
+            },
+        ),
+        migrations.RunPython(backfill_leaderboard, migrations.RunPython.noop),
+    ]
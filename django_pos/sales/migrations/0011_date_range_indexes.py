@@ -0,0 +1,25 @@
+# Generated by Django 4.1.5 on 2026-10-18 07:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_stockmovement'),
+        ('sales', '0010_dailyproductsales'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dailyproductsales',
+            name='product',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='products.product'),
+        ),
+        migrations.AlterField(
+            model_name='sale',
+            name='date_added',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.1.5 on 2026-10-18 07:10
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_counts(apps, schema_editor):
+    Sale = apps.get_model('sales', 'Sale')
+    SaleDetail = apps.get_model('sales', 'SaleDetail')
+    details = SaleDetail.objects.filter(sale=OuterRef('pk')).values('sale')
+    Sale.objects.update(
+        item_count=Coalesce(Subquery(details.annotate(total=Sum('quantity')).values('total')), 0,
+                            output_field=IntegerField()),
+        line_count=Coalesce(Subquery(details.annotate(total=Count('id')).values('total')), 0,
+                            output_field=IntegerField()),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0011_date_range_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sale',
+            name='item_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='line_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counts, migrations.RunPython.noop),
+    ]
@@ -4,7 +4,8 @@ from products.models import Product
 
 
 class Sale(models.Model):    
-    date_added = models.DateTimeField(auto_now_add=True)
+    # Indexed for the date range filters of the dashboard, lists and exports
+    date_added = models.DateTimeField(auto_now_add=True, db_index=True)
     customer = models.ForeignKey(
         Customer, models.DO_NOTHING, db_column='customer')
     sub_total = models.FloatField(default=0)
@@ -13,6 +14,12 @@ class Sale(models.Model):
     tax_percentage = models.FloatField(default=16)
     amount_payed = models.FloatField(default=0)
     amount_change = models.FloatField(default=0)
+    # Key generated by the till for each checkout, so retries are not duplicated
+    checkout_key = models.CharField(
+        max_length=64, unique=True, blank=True, null=True)
+    # Units sold and number of details, saved with the details at checkout
+    item_count = models.IntegerField(default=0)
+    line_count = models.IntegerField(default=0)
 
     class Meta:
         db_table = 'Sales'
@@ -21,8 +28,7 @@ class Sale(models.Model):
         return "Sale ID: " + str(self.id) + " | Grand Total: " + str(self.grand_total) + " | Datetime: " + str(self.date_added)
 
     def sum_items(self):
-        details = SaleDetail.objects.filter(sale=self.id)
-        return sum([d.quantity for d in details])
+        return self.item_count
 
 
 class SaleDetail(models.Model):
@@ -33,9 +39,54 @@ class SaleDetail(models.Model):
     price = models.FloatField()
     quantity = models.IntegerField()
     total_detail = models.FloatField()
+    # Buying price of the product when it was sold
+    unit_cost = models.FloatField(default=0)
 
     class Meta:
         db_table = 'SaleDetails'
 
     def __str__(self) -> str:
         return "Detail ID: " + str(self.id) + " Sale ID: " + str(self.sale.id) + " Quantity: " + str(self.quantity)
+
+
+class DailySalesSummary(models.Model):
+    """
+    Totals of the sales made on one local day. Every checkout adds to it in
+    the same transaction and the rebuild_sales_summary command recomputes it
+    from history.
+    """
+    date = models.DateField(unique=True)
+    revenue = models.FloatField(default=0)  # Sum of the grand totals
+    cost = models.FloatField(default=0)  # Buying price of the units sold
+    # Amount payed minus cost, the way the dashboard has always shown profit
+    profit = models.FloatField(default=0)
+    units = models.IntegerField(default=0)
+    sale_count = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'DailySalesSummaries'
+        verbose_name_plural = "Daily sales summaries"
+
+    def __str__(self) -> str:
+        return "Date: " + str(self.date) + " | Revenue: " + str(self.revenue) + " | Sales: " + str(self.sale_count)
+
+
+class DailyProductSales(models.Model):
+    """
+    Units of one product sold on one local day, the buckets of the top sellers
+    leaderboard. Every checkout adds to it in the same transaction and the
+    rebuild_leaderboard command recomputes it from history.
+    """
+    date = models.DateField()
+    # Not indexed on its own, SQLite would rather scan that index to group
+    # by product than search the date range of a window
+    product = models.ForeignKey(Product, models.CASCADE, db_index=False)
+    units = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'DailyProductSales'
+        verbose_name_plural = "Daily product sales"
+        unique_together = ("date", "product")
+
+    def __str__(self) -> str:
+        return "Date: " + str(self.date) + " | Product: " + str(self.product_id) + " | Units: " + str(self.units)
@@ -0,0 +1,277 @@
+import hashlib
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import tinycss2
+from django.conf import settings
+from django.db import connection
+from django.template import engines
+from django.template.loader import get_template
+from weasyprint import HTML, CSS
+from weasyprint.text.fonts import FontConfiguration
+from .models import Sale, SaleDetail
+
+RECEIPT_TEMPLATE = "sales/sales_receipt_pdf.html"
+RECEIPT_STYLESHEET = os.path.join(
+    settings.BASE_DIR, 'static/css/receipt_pdf/bootstrap.min.css')
+
+# Renders run in the background so the request threads never wait on WeasyPrint
+_executor = ThreadPoolExecutor(
+    max_workers=settings.RECEIPT_RENDER_WORKERS,
+    thread_name_prefix="receipts",
+)
+# Receipts being rendered, by cache path
+_pending = {}
+_pending_lock = threading.Lock()
+_render_context = None
+_render_context_lock = threading.Lock()
+
+CLASS_ATTRIBUTE = re.compile(r'class="([^"]*)"')
+# At-rules that can never affect a static receipt
+DROPPED_AT_RULES = ("keyframes", "-webkit-keyframes")
+
+
+def _selector_classes(tokens):
+    """
+    Returns the classes an element needs to match the selector tokens.
+    Classes nested in functions such as :not() are not required.
+    """
+    classes = set()
+    for previous, token in zip(tokens, tokens[1:]):
+        if previous == "." and token.type == "ident":
+            classes.add(token.value)
+    return classes
+
+
+def _trim_rules(rules, used_classes):
+    """
+    Keeps the rules whose selectors can match an element of the receipt,
+    filtering the selector lists and the rules nested in @media and @supports.
+    """
+    kept = []
+    for rule in rules:
+        if rule.type == "qualified-rule":
+            selectors = [[]]
+            for token in rule.prelude:
+                if token == ",":
+                    selectors.append([])
+                elif token.type not in ("whitespace", "comment") or selectors[-1]:
+                    selectors[-1].append(token)
+            matching = [
+                tinycss2.serialize(selector).strip() for selector in selectors
+                if _selector_classes(selector) <= used_classes
+            ]
+            if matching:
+                kept.append(",".join(matching) + "{" +
+                            tinycss2.serialize(rule.content) + "}")
+        elif rule.type == "at-rule":
+            if rule.lower_at_keyword in DROPPED_AT_RULES:
+                continue
+            if rule.lower_at_keyword in ("media", "supports") and rule.content:
+                nested = _trim_rules(tinycss2.parse_rule_list(
+                    rule.content, skip_comments=True, skip_whitespace=True), used_classes)
+                if nested:
+                    kept.append("@" + rule.at_keyword + tinycss2.serialize(rule.prelude) +
+                                "{" + "".join(nested) + "}")
+            else:
+                kept.append(rule.serialize())
+    return kept
+
+
+def trim_stylesheet(css, template_source):
+    """
+    Args:
+        css: Source of the stylesheet
+        template_source: Source of the template the stylesheet is used with
+
+    Returns the stylesheet without the rules that need a class the template
+    never uses, which is most of Bootstrap.
+    """
+    used_classes = set()
+    for value in CLASS_ATTRIBUTE.findall(template_source):
+        used_classes.update(value.split())
+    rules = tinycss2.parse_stylesheet(
+        css, skip_comments=True, skip_whitespace=True)
+    return "".join(_trim_rules(rules, used_classes))
+
+
+class ReceiptRenderContext:
+    """
+    Everything WeasyPrint needs to render a receipt that does not depend on
+    the sale: the template and the stylesheet, parsed once per process.
+    """
+
+    def __init__(self):
+        # Read from disk, the cached template loader would not see changes
+        self.template_path = get_template(RECEIPT_TEMPLATE).origin.name
+        self.mtimes = self._mtimes()
+        with open(self.template_path, encoding="utf-8") as template_file:
+            source = template_file.read()
+        self.template = engines["django"].from_string(source)
+
+        with open(RECEIPT_STYLESHEET, encoding="utf-8") as css_file:
+            css = trim_stylesheet(css_file.read(), source)
+        self.version = hashlib.sha1(
+            (source + css).encode("utf-8")).hexdigest()[:12]
+        self.stylesheet = CSS(string=css)
+        self._local = threading.local()
+
+    def _mtimes(self):
+        return (os.stat(self.template_path).st_mtime_ns,
+                os.stat(RECEIPT_STYLESHEET).st_mtime_ns)
+
+    def is_stale(self):
+        """
+        Returns True when the template or the stylesheet changed on disk.
+        """
+        try:
+            return self._mtimes() != self.mtimes
+        except OSError:
+            return True
+
+    @property
+    def font_config(self):
+        # WeasyPrint font configurations are not shared between threads
+        if not hasattr(self._local, "font_config"):
+            self._local.font_config = FontConfiguration()
+        return self._local.font_config
+
+    def document(self, context):
+        """
+        Args:
+            context: Context for the receipt template
+
+        Returns the laid out WeasyPrint document, whose pages can be merged
+        with the ones of other receipts.
+        """
+        html_template = self.template.render(context)
+        return HTML(string=html_template).render(
+            stylesheets=[self.stylesheet],
+            font_config=self.font_config,
+        )
+
+    def render(self, context, target=None):
+        """
+        Args:
+            context: Context for the receipt template
+            target: Optional filename or file object to write the PDF to
+        """
+        return self.document(context).write_pdf(target=target)
+
+
+def get_render_context():
+    """
+    Returns the process-wide receipt render context, rebuilt when the
+    template or the stylesheet changes.
+    """
+    global _render_context
+    render_context = _render_context
+    if render_context is None or render_context.is_stale():
+        with _render_context_lock:
+            if _render_context is None or _render_context.is_stale():
+                _render_context = ReceiptRenderContext()
+            render_context = _render_context
+    return render_context
+
+
+def template_version():
+    """
+    Returns a short hash of the receipt template and stylesheet, used in the
+    cache path so a change never serves receipts rendered with the old ones.
+    """
+    return get_render_context().version
+
+
+def receipt_path(sale_id):
+    """
+    Args:
+        sale_id: ID of the sale
+
+    Returns the path where the receipt PDF of the sale is cached.
+    """
+    return os.path.join(
+        settings.RECEIPT_CACHE_DIR, template_version(), str(sale_id) + ".pdf")
+
+
+def render_receipt(sale, details=None):
+    """
+    Args:
+        sale: The sale whose receipt is rendered
+        details: The sale details, queried when not given
+
+    Returns the receipt PDF as bytes.
+    """
+    if details is None:
+        # Get the sale details
+        details = SaleDetail.objects.filter(sale=sale).select_related("product")
+
+    context = {
+        "sale": sale,
+        "details": details
+    }
+    return get_render_context().render(context)
+
+
+def _render_to_disk(sale_id, path):
+    try:
+        sale = Sale.objects.select_related("customer").get(id=sale_id)
+        pdf = render_receipt(sale)
+
+        # Write to a temporary file first so readers never see half a PDF
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = path + "." + str(threading.get_ident()) + ".tmp"
+        with open(temp_path, "wb") as temp_file:
+            temp_file.write(pdf)
+        os.replace(temp_path, path)
+        return path
+    finally:
+        # Each worker thread has its own database connection
+        connection.close()
+
+
+def _forget(path):
+    with _pending_lock:
+        _pending.pop(path, None)
+
+
+def schedule_receipt(sale_id):
+    """
+    Queues the receipt of the sale to be rendered in the background.
+
+    Args:
+        sale_id: ID of the sale
+
+    Returns a future that resolves to the cached path, or None when the
+    receipt is already on disk.
+    """
+    path = receipt_path(sale_id)
+    with _pending_lock:
+        future = _pending.get(path)
+        if future is not None:
+            return future
+        if os.path.exists(path):
+            return None
+        future = _executor.submit(_render_to_disk, sale_id, path)
+        _pending[path] = future
+    future.add_done_callback(lambda done: _forget(path))
+    return future
+
+
+def get_receipt(sale_id):
+    """
+    Returns the path of the cached receipt PDF, waiting for the render job
+    when it is not ready yet.
+
+    Args:
+        sale_id: ID of the sale
+    """
+    path = receipt_path(sale_id)
+    if os.path.exists(path):
+        return path
+
+    future = schedule_receipt(sale_id)
+    if future is not None:
+        future.result()
+    return path
@@ -0,0 +1,375 @@
+from functools import partial
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from customers.models import Customer
+from products.catalog import get_catalog
+from products.models import Product, StockMovement
+from .leaderboard import add_to_leaderboard
+from .models import Sale, SaleDetail
+from .receipts import schedule_receipt
+from .signals import sales_changed
+from .summary import add_to_daily_summary
+
+# Largest number of queued sales accepted by checkout_batch in one call
+BATCH_MAX_SALES = 1000
+
+SALE_AMOUNT_FIELDS = (
+    "sub_total",
+    "grand_total",
+    "tax_amount",
+    "tax_percentage",
+    "amount_payed",
+    "amount_change",
+)
+
+
+class InsufficientStock(Exception):
+    """
+    Raised when one or more cart lines cannot be covered by the current stock.
+    Every failing line is collected so the till can report them all at once.
+    """
+
+    def __init__(self, lines):
+        self.lines = lines
+        super().__init__(
+            "Insufficient stock for: " + ", ".join(line["name"] for line in lines))
+
+
+def parse_cart(products_data):
+    """
+    Args:
+        products_data: The "products" list posted by the sale page
+
+    Returns the cart lines with their numbers parsed and the total quantity
+    requested per product, so a product added twice is checked only once.
+    """
+    lines = []
+    quantities = {}
+    for product_data in products_data:
+        line = {
+            "product_id": int(product_data["id"]),
+            "price": float(product_data["price"]),
+            "quantity": int(product_data["quantity"]),
+            "total_product": float(product_data["total_product"]),
+        }
+        if line["quantity"] <= 0:
+            raise ValueError("Invalid quantity for product: " +
+                             str(line["product_id"]))
+        lines.append(line)
+        quantities[line["product_id"]] = quantities.get(
+            line["product_id"], 0) + line["quantity"]
+    return lines, quantities
+
+
+def parse_sale(data):
+    """
+    Args:
+        data: A sale as posted by the sale page or queued by an offline till
+
+    Returns the keyword arguments used to create the Sale.
+    """
+    attributes = {"customer_id": int(data["customer"])}
+    for field in SALE_AMOUNT_FIELDS:
+        attributes[field] = float(data[field])
+    return attributes
+
+
+def cart_counts(lines):
+    """
+    Returns the item_count and line_count of the sale made of the cart lines.
+    """
+    return {
+        "item_count": sum(line["quantity"] for line in lines),
+        "line_count": len(lines),
+    }
+
+
+def sale_movements(sale, quantities):
+    """
+    Returns the unsaved stock movements that take the sold units out of stock.
+    """
+    return [
+        StockMovement(
+            product_id=product_id,
+            quantity=-quantity,
+            reason="SALE",
+            reference=str(sale.pk),
+        )
+        for product_id, quantity in sorted(quantities.items())
+    ]
+
+
+def checkout(sale_attributes, products_data, checkout_key=None):
+    """
+    Creates a sale, its details and decrements the stock in one transaction.
+
+    The current stock of the cart products is read in a single query, the
+    names and buying prices come from the worker's product catalog, and the
+    units sold are appended to the stock ledger. The product rows are locked
+    with select_for_update before their stock is read, so a concurrent
+    checkout waits until this one commits and then sees its movements: two
+    tills cannot both sell the last unit. If any line lacks stock the whole
+    transaction is rolled back and InsufficientStock lists every failing line.
+
+    When a checkout_key is given and a sale was already created with it, that
+    sale is returned untouched, so a till retrying a timed out request never
+    sells the same basket twice.
+
+    Args:
+        sale_attributes: Keyword arguments used to create the Sale
+        products_data: The "products" list posted by the sale page
+        checkout_key: Idempotency key generated by the till for this checkout
+
+    Returns a (sale, created) tuple.
+    """
+    if checkout_key:
+        sale = Sale.objects.filter(checkout_key=checkout_key).first()
+        if sale is not None:
+            return sale, False
+
+    lines, quantities = parse_cart(products_data)
+    if not lines:
+        raise ValueError("The sale must have at least 1 product")
+
+    try:
+        with transaction.atomic():
+            # Created first so a concurrent replay fails before touching stock
+            sale = Sale.objects.create(
+                checkout_key=checkout_key or None, **sale_attributes, **cart_counts(lines))
+
+            # Only the stock is read from the database, the rest of the
+            # product comes from the worker's catalog. The product rows stay
+            # locked until the movements are written, in ID order so two
+            # checkouts never wait for each other's locks.
+            # Trade-off: checkouts of the same product run one after the other
+            # for the few queries left in this transaction, other products are
+            # not held up. A conditional insert into the ledger can not replace
+            # the lock, two transactions would both sum the movements before
+            # either one commits and sell the same units
+            available = dict(Product.objects.with_current_stock().select_for_update().filter(
+                id__in=list(quantities)).order_by("id").values_list("id", "current_stock"))
+            missing = [pid for pid in quantities if pid not in available]
+            if missing:
+                raise Product.DoesNotExist(
+                    "Products not found: " + ", ".join(str(pid) for pid in missing))
+            products = get_catalog().get_many(list(quantities))
+
+            insufficient = [
+                {
+                    "id": product_id,
+                    "name": products[product_id].name,
+                    "requested": quantity,
+                    "available": available[product_id],
+                }
+                for product_id, quantity in sorted(quantities.items())
+                if available[product_id] < quantity
+            ]
+            if insufficient:
+                # Leaving the atomic block with an exception undoes the sale
+                raise InsufficientStock(insufficient)
+
+            SaleDetail.objects.bulk_create([
+                SaleDetail(
+                    sale=sale,
+                    product_id=line["product_id"],
+                    price=line["price"],
+                    quantity=line["quantity"],
+                    total_detail=line["total_product"],
+                    unit_cost=products[line["product_id"]].buying_price,
+                )
+                for line in lines
+            ])
+            StockMovement.objects.bulk_create(
+                sale_movements(sale, quantities))
+            add_to_daily_summary([(sale, lines)], products)
+            add_to_leaderboard([(sale, lines)])
+            # Have the receipt ready before the cashier asks for it
+            transaction.on_commit(partial(schedule_receipt, sale.pk))
+            transaction.on_commit(partial(sales_changed.send, sender=Sale))
+    except IntegrityError:
+        # Another request with the same key won the race
+        if checkout_key:
+            sale = Sale.objects.filter(checkout_key=checkout_key).first()
+            if sale is not None:
+                return sale, False
+        raise
+
+    return sale, True
+
+
+def checkout_batch(entries):
+    """
+    Creates many queued sales at once, as pushed by a till coming back online.
+
+    Customers, products and already used checkout keys are loaded with one
+    query each, the stock is checked in memory in the order the sales were made
+    and all the accepted sales, details and stock changes are written in bulk
+    inside one transaction. A sale that cannot be created does not prevent the
+    rest of the batch from being saved.
+
+    Args:
+        entries: List of sales, each one like the sale page payload plus a
+            required "checkout_key" and an optional ISO "date_added"
+
+    Returns one {"status": ...} dict per entry, in the same order. The status
+    is "created", "duplicate", "invalid" or "insufficient_stock".
+    """
+    if len(entries) > BATCH_MAX_SALES:
+        raise ValueError("A batch can not have more than " +
+                         str(BATCH_MAX_SALES) + " sales")
+
+    results = [None] * len(entries)
+    pending = []
+    for index, data in enumerate(entries):
+        try:
+            checkout_key = str(data.get("checkout_key") or "")
+            if not checkout_key:
+                raise ValueError("checkout_key is required")
+            attributes = parse_sale(data)
+            lines, quantities = parse_cart(data["products"])
+            if not lines:
+                raise ValueError("The sale must have at least 1 product")
+            date_added = None
+            if data.get("date_added"):
+                date_added = parse_datetime(str(data["date_added"]))
+                if date_added is None:
+                    raise ValueError("Invalid date_added: " +
+                                     str(data["date_added"]))
+                if timezone.is_naive(date_added):
+                    date_added = timezone.make_aware(date_added)
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            results[index] = {"status": "invalid", "error": str(e)}
+            continue
+        pending.append({
+            "index": index,
+            "checkout_key": checkout_key,
+            "attributes": attributes,
+            "lines": lines,
+            "quantities": quantities,
+            "date_added": date_added,
+        })
+
+    if not pending:
+        return results
+
+    with transaction.atomic():
+        used_keys = dict(Sale.objects.filter(
+            checkout_key__in=[entry["checkout_key"] for entry in pending]
+        ).values_list("checkout_key", "id"))
+        customer_ids = set(Customer.objects.filter(
+            id__in={entry["attributes"]["customer_id"] for entry in pending}
+        ).values_list("id", flat=True))
+        product_ids = list({pid for entry in pending for pid in entry["quantities"]})
+        available = dict(Product.objects.with_current_stock().select_for_update().filter(
+            id__in=product_ids).order_by("id").values_list("id", "current_stock"))
+        products = get_catalog().get_many(list(available))
+
+        accepted = []
+        batch_keys = {}
+        for entry in pending:
+            index = entry["index"]
+            if entry["checkout_key"] in used_keys:
+                results[index] = {
+                    "status": "duplicate",
+                    "sale_id": used_keys[entry["checkout_key"]],
+                }
+                continue
+            if entry["checkout_key"] in batch_keys:
+                # Same sale queued twice, resolved once the first one is saved
+                results[index] = batch_keys[entry["checkout_key"]]
+                continue
+            if entry["attributes"]["customer_id"] not in customer_ids:
+                results[index] = {"status": "invalid",
+                                  "error": "Customer not found"}
+                continue
+            missing = [pid for pid in entry["quantities"] if pid not in available]
+            if missing:
+                results[index] = {
+                    "status": "invalid",
+                    "error": "Products not found: " + ", ".join(str(pid) for pid in missing),
+                }
+                continue
+            insufficient = [
+                {
+                    "id": pid,
+                    "name": products[pid].name,
+                    "requested": quantity,
+                    "available": available[pid],
+                }
+                for pid, quantity in entry["quantities"].items()
+                if available[pid] < quantity
+            ]
+            if insufficient:
+                results[index] = {"status": "insufficient_stock",
+                                  "lines": insufficient}
+                continue
+
+            for pid, quantity in entry["quantities"].items():
+                available[pid] -= quantity
+            results[index] = {"status": "created"}
+            batch_keys[entry["checkout_key"]] = {"status": "duplicate"}
+            accepted.append(entry)
+
+        if not accepted:
+            return results
+
+        sales = Sale.objects.bulk_create([
+            Sale(checkout_key=entry["checkout_key"], **entry["attributes"],
+                 **cart_counts(entry["lines"]))
+            for entry in accepted
+        ])
+        if any(sale.pk is None for sale in sales):
+            # The database can not return the ids of bulk inserted rows
+            ids = dict(Sale.objects.filter(
+                checkout_key__in=[sale.checkout_key for sale in sales]
+            ).values_list("checkout_key", "id"))
+            for sale in sales:
+                sale.pk = ids[sale.checkout_key]
+
+        dated = [(sale.pk, entry["date_added"])
+                 for sale, entry in zip(sales, accepted) if entry["date_added"]]
+        if dated:
+            # auto_now_add ignores given values, so the till's time is set after
+            Sale.objects.filter(pk__in=[pk for pk, _ in dated]).update(
+                date_added=Case(
+                    *[When(pk=pk, then=Value(date_added)) for pk, date_added in dated],
+                    output_field=DateTimeField(),
+                ))
+            for sale, entry in zip(sales, accepted):
+                if entry["date_added"]:
+                    sale.date_added = entry["date_added"]
+
+        SaleDetail.objects.bulk_create([
+            SaleDetail(
+                sale=sale,
+                product_id=line["product_id"],
+                price=line["price"],
+                quantity=line["quantity"],
+                total_detail=line["total_product"],
+                unit_cost=products[line["product_id"]].buying_price,
+            )
+            for sale, entry in zip(sales, accepted)
+            for line in entry["lines"]
+        ], batch_size=500)
+
+        StockMovement.objects.bulk_create([
+            movement
+            for sale, entry in zip(sales, accepted)
+            for movement in sale_movements(sale, entry["quantities"])
+        ], batch_size=500)
+        sold = [(sale, entry["lines"]) for sale, entry in zip(sales, accepted)]
+        add_to_daily_summary(sold, products)
+        add_to_leaderboard(sold)
+
+        for sale in sales:
+            transaction.on_commit(partial(schedule_receipt, sale.pk))
+        transaction.on_commit(partial(sales_changed.send, sender=Sale))
+
+    for sale, entry in zip(sales, accepted):
+        results[entry["index"]]["sale_id"] = sale.pk
+        batch_keys[entry["checkout_key"]]["sale_id"] = sale.pk
+
+    return results
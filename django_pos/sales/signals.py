@@ -0,0 +1,16 @@
+from django.db.models.signals import pre_delete
+from django.dispatch import Signal, receiver
+from .leaderboard import remove_from_leaderboard
+from .models import Sale
+from .summary import remove_from_daily_summary
+
+# Sent once sales were created in bulk or the sales summary was rebuilt,
+# after the transaction is committed. Bulk inserts do not send post_save.
+sales_changed = Signal()
+
+
+# Sent while the details of the sale still exist, they are deleted after it
+@receiver(pre_delete, sender=Sale)
+def sale_deleted(sender, instance, **kwargs):
+    remove_from_daily_summary(instance)
+    remove_from_leaderboard(instance)
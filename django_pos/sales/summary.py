@@ -0,0 +1,210 @@
+from datetime import datetime, time, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, FloatField, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+from .models import DailySalesSummary, Sale, SaleDetail
+
+SUMMARY_FIELDS = ("revenue", "cost", "profit", "units", "sale_count")
+
+
+def local_period(first_day, last_day):
+    """
+    Returns the aware [start, end) datetimes covering both days completely
+    in the local timezone.
+    """
+    start = timezone.make_aware(datetime.combine(first_day, time.min))
+    end = timezone.make_aware(
+        datetime.combine(last_day + timedelta(days=1), time.min))
+    return start, end
+
+
+def sales_in_period(start, end):
+    """
+    Args:
+        start: Aware datetime, first moment included
+        end: Aware datetime, first moment excluded
+
+    Returns the sales of [start, end). The date range queries of the
+    dashboard, the summary and the exports all start from here, so they
+    search the date_added index the same way.
+    """
+    return Sale.objects.filter(date_added__gte=start, date_added__lt=end)
+
+
+def details_in_period(start, end):
+    """
+    Returns the details of the sales of [start, end), see sales_in_period.
+    """
+    return SaleDetail.objects.filter(
+        sale__date_added__gte=start, sale__date_added__lt=end)
+
+
+def summarize_sales(sold, products):
+    """
+    Args:
+        sold: Iterable of (sale, lines) with the lines parsed by parse_cart
+        products: The products of the lines, by ID
+
+    Returns the totals to add to the summary of each local day.
+    """
+    totals_by_day = {}
+    for sale, lines in sold:
+        day = timezone.localdate(sale.date_added)
+        # Same buying price that is saved as the unit cost of each detail
+        cost = sum(products[line["product_id"]].buying_price * line["quantity"]
+                   for line in lines)
+        totals = totals_by_day.setdefault(
+            day, dict.fromkeys(SUMMARY_FIELDS, 0))
+        totals["revenue"] += sale.grand_total
+        totals["cost"] += cost
+        totals["profit"] += sale.amount_payed - cost
+        totals["units"] += sum(line["quantity"] for line in lines)
+        totals["sale_count"] += 1
+    return totals_by_day
+
+
+def add_to_daily_summary(sold, products):
+    """
+    Adds the sales to the daily summary. Meant to run inside the transaction
+    that creates the sales, so the summary never drifts from them.
+
+    Args:
+        sold: Iterable of (sale, lines) with the lines parsed by parse_cart
+        products: The products of the lines, by ID
+    """
+    for day, totals in sorted(summarize_sales(sold, products).items()):
+        increments = {field: F(field) + value for field, value in totals.items()}
+        if DailySalesSummary.objects.filter(date=day).update(**increments):
+            continue
+        try:
+            # First sale of the day
+            with transaction.atomic():
+                DailySalesSummary.objects.create(date=day, **totals)
+        except IntegrityError:
+            # Another till created the day in the meantime
+            DailySalesSummary.objects.filter(date=day).update(**increments)
+
+
+def remove_from_daily_summary(sale):
+    """
+    Subtracts a sale from the summary of its day, the opposite of
+    add_to_daily_summary. Meant to run inside the transaction that deletes
+    the sale, before its details are deleted.
+    """
+    details = SaleDetail.objects.filter(sale=sale).aggregate(
+        units=Coalesce(Sum("quantity"), 0),
+        cost=Coalesce(Sum(F("quantity") * F("unit_cost")), 0.0,
+                      output_field=FloatField()),
+    )
+    totals = {
+        "revenue": sale.grand_total,
+        "cost": details["cost"],
+        "profit": sale.amount_payed - details["cost"],
+        "units": details["units"],
+        "sale_count": 1,
+    }
+    day = DailySalesSummary.objects.filter(date=timezone.localdate(sale.date_added))
+    day.update(**{field: F(field) - value for field, value in totals.items()})
+    # Like the rebuild, days without sales have no summary
+    day.filter(sale_count__lte=0).delete()
+
+
+def sales_totals(start, end):
+    """
+    Computes the summary fields for the sales of [start, end) straight from
+    the sales and their details, without joining the products.
+
+    Args:
+        start: Aware datetime, first moment included
+        end: Aware datetime, first moment excluded
+    """
+    sales = sales_in_period(start, end).aggregate(
+        revenue=Coalesce(Sum("grand_total"), 0.0, output_field=FloatField()),
+        payed=Coalesce(Sum("amount_payed"), 0.0, output_field=FloatField()),
+        sale_count=Count("id"),
+    )
+    details = details_in_period(start, end).aggregate(
+        units=Coalesce(Sum("quantity"), 0),
+        cost=Coalesce(Sum(F("quantity") * F("unit_cost")), 0.0,
+                      output_field=FloatField()),
+    )
+    return {
+        "revenue": sales["revenue"],
+        "cost": details["cost"],
+        "profit": sales["payed"] - details["cost"],
+        "units": details["units"],
+        "sale_count": sales["sale_count"],
+    }
+
+
+def rebuild_daily_summary():
+    """
+    Recomputes the whole daily summary from the sales and their details.
+
+    Returns the number of days in the summary.
+    """
+    tz = timezone.get_current_timezone()
+
+    with transaction.atomic():
+        # Deleting first takes the write lock, so no sale is missed meanwhile
+        DailySalesSummary.objects.all().delete()
+
+        days = {}
+        sales = Sale.objects.annotate(
+            day=TruncDate("date_added", tzinfo=tz)
+        ).values("day").annotate(
+            revenue=Sum("grand_total"),
+            payed=Sum("amount_payed"),
+            sale_count=Count("id"),
+        ).order_by()
+        for row in sales:
+            days[row["day"]] = DailySalesSummary(
+                date=row["day"],
+                revenue=row["revenue"] or 0,
+                profit=row["payed"] or 0,
+                sale_count=row["sale_count"],
+            )
+
+        # The cost snapshot on each detail avoids joining the products
+        details = SaleDetail.objects.annotate(
+            day=TruncDate("sale__date_added", tzinfo=tz)
+        ).values("day").annotate(
+            units=Sum("quantity"),
+            cost=Sum(F("quantity") * F("unit_cost"),
+                     output_field=FloatField()),
+        ).order_by()
+        for row in details:
+            summary = days[row["day"]]
+            summary.units = row["units"] or 0
+            summary.cost = row["cost"] or 0
+            summary.profit -= summary.cost
+
+        DailySalesSummary.objects.bulk_create(days.values(), batch_size=500)
+    return len(days)
+
+
+def check_sale_counts(fix=False):
+    """
+    Compares the item_count and line_count saved on each sale with its
+    details.
+
+    Args:
+        fix: Save the counts computed from the details on the wrong sales
+
+    Returns the IDs of the sales whose counts were wrong.
+    """
+    with transaction.atomic():
+        wrong = list(Sale.objects.annotate(
+            items=Coalesce(Sum("saledetail__quantity"), 0),
+            lines=Count("saledetail"),
+        ).exclude(
+            item_count=F("items"), line_count=F("lines")
+        ).values_list("id", "items", "lines"))
+
+        if fix:
+            for sale_id, items, lines in wrong:
+                Sale.objects.filter(id=sale_id).update(
+                    item_count=items, line_count=lines)
+    return [sale_id for sale_id, _, _ in wrong]
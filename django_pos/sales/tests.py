@@ -1,3 +1,811 @@
-from django.test import TestCase
+import importlib
+import io
+import json
+import os
+import re
+import tempfile
+import zipfile
+from datetime import date, datetime, timezone as dt_timezone
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from customers.models import Customer
+from products.models import Category, Product, StockMovement
+from pos.dashboard import dashboard_context, metrics_series
+from pos.testing import POSTestCase, POSTransactionTestCase
+from . import receipts
+from .export import export_sales, render_receipts_pdf, stream_receipts_zip
+from .leaderboard import (LEADERBOARD_WINDOWS, add_to_leaderboard, rebuild_leaderboard,
+                          top_sellers)
+from .listing import SALES_ORDER_COLUMNS, filter_sales, sales_page
+from .models import DailyProductSales, DailySalesSummary, Sale
+from .services import (BATCH_MAX_SALES, InsufficientStock, checkout, checkout_batch,
+                       parse_sale)
+from .summary import (SUMMARY_FIELDS, check_sale_counts, details_in_period, local_period,
+                      rebuild_daily_summary, sales_in_period, sales_totals)
+from .thermal import ESC_FEED_AND_CUT, ESC_INIT, RECEIPT_WIDTH, render_escpos, render_text
+
+# Tables that must only be read through an index when filtered by date
+DATE_FILTERED_TABLES = ("Sales", "SaleDetails", "DailySalesSummaries", "DailyProductSales")
+FULL_SCAN = re.compile(r"\bSCAN (" + "|".join(DATE_FILTERED_TABLES) + r")\b")
+DATE_FILTER = re.compile(r'\bWHERE\b.*"(date|date_added)" [<>]')
+
+
+class SalesTestCase(POSTestCase):
+    """
+    A cashier, a customer and two products with 5 units in stock each.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("cashier", password="secret")
+        cls.customer = Customer.objects.create(
+            first_name="Ann", last_name="Lee", email="ann@example.com", phone="0712345678")
+        cls.category = Category.objects.create(
+            name="Drinks", description="Drinks", status="ACTIVE")
+        cls.soda = Product.objects.create(
+            name="Soda", description="Soda", status="ACTIVE", category=cls.category,
+            price=2, buying_price=1, stock=5)
+        cls.water = Product.objects.create(
+            name="Water", description="Water", status="ACTIVE", category=cls.category,
+            price=1, buying_price=0.5, stock=5)
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def sale_data(self, quantities, checkout_key=None, **extra):
+        """
+        Returns a sale as the sale page posts it, quantities by product.
+        """
+        products = [
+            {"id": product.id, "price": product.price, "quantity": quantity,
+             "total_product": product.price * quantity}
+            for product, quantity in quantities.items()
+        ]
+        total = sum(line["total_product"] for line in products)
+        data = {
+            "customer": self.customer.id,
+            "sub_total": total,
+            "grand_total": total,
+            "tax_amount": 0,
+            "tax_percentage": 0,
+            "amount_payed": total,
+            "amount_change": 0,
+            "products": products,
+        }
+        if checkout_key:
+            data["checkout_key"] = checkout_key
+        data.update(extra)
+        return data
+
+    def checkout(self, data):
+        return checkout(parse_sale(data), data["products"], data.get("checkout_key"))
+
+    def current_stock(self, product):
+        return Product.objects.with_current_stock().get(id=product.id).current_stock
+
+    def post_sale(self, data):
+        return self.client.post("/sales/add", json.dumps(data), content_type="application/json",
+                                HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+
+
+class SalesAddViewTests(SalesTestCase):
+
+    def test_sale_is_created(self):
+        response = self.post_sale(self.sale_data({self.soda: 2}))
+        self.assertEqual(response.status_code, 200)
+        sale = Sale.objects.get(id=response.json()["sale_id"])
+        self.assertEqual(sale.saledetail_set.get().quantity, 2)
+
+    def test_unknown_customer_returns_json_error(self):
+        with self.assertLogs("sales.views", level="ERROR"):
+            response = self.post_sale(self.sale_data({self.soda: 1}, customer=999999))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("error", response.json())
+        self.assertFalse(Sale.objects.exists())
+
+    def test_invalid_body_returns_json_error(self):
+        with self.assertLogs("sales.views", level="ERROR"):
+            response = self.client.post("/sales/add", "{not json", content_type="application/json",
+                                        HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+        self.assertEqual(response.status_code, 400)
+
+
+class CheckoutStockTests(SalesTestCase):
+
+    def test_insufficient_stock_leaves_nothing_behind(self):
+        with self.assertRaises(InsufficientStock) as raised:
+            self.checkout(self.sale_data({self.soda: 6, self.water: 9}, checkout_key="till-1-0009"))
+
+        self.assertEqual([line["id"] for line in raised.exception.lines],
+                         [self.soda.id, self.water.id])
+        self.assertFalse(Sale.objects.exists())
+        self.assertFalse(StockMovement.objects.exists())
+        self.assertEqual(self.current_stock(self.soda), 5)
+
+    def test_last_units_can_not_be_sold_twice(self):
+        self.checkout(self.sale_data({self.soda: 5}))
+        response = self.post_sale(self.sale_data({self.soda: 1}))
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["insufficient_stock"][0]["available"], 0)
+        self.assertEqual(Sale.objects.count(), 1)
+        self.assertEqual(self.current_stock(self.soda), 0)
+
+    def test_product_added_twice_is_checked_once(self):
+        data = self.sale_data({self.soda: 3})
+        data["products"].append(dict(data["products"][0]))
+        with self.assertRaises(InsufficientStock):
+            self.checkout(data)
+
+    @skipUnlessDBFeature("has_select_for_update")
+    def test_stock_is_read_with_the_rows_locked(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.checkout(self.sale_data({self.soda: 1}))
+        stock_reads = [query["sql"] for query in queries.captured_queries
+                       if "current_stock" in query["sql"]]
+        self.assertTrue(stock_reads)
+        self.assertTrue(all("FOR UPDATE" in sql for sql in stock_reads))
+
+
+class CheckoutKeyTests(SalesTestCase):
+
+    def test_replay_returns_the_same_sale(self):
+        data = self.sale_data({self.soda: 2}, checkout_key="till-1-0001")
+        first = self.post_sale(data).json()
+        second = self.post_sale(data).json()
+
+        self.assertTrue(first["created"])
+        self.assertFalse(second["created"])
+        self.assertEqual(first["sale_id"], second["sale_id"])
+        self.assertEqual(Sale.objects.count(), 1)
+        self.assertEqual(StockMovement.objects.count(), 1)
+        self.assertEqual(self.current_stock(self.soda), 3)
+
+    def test_replay_with_another_basket_keeps_the_first_sale(self):
+        sale, _ = self.checkout(self.sale_data({self.soda: 1}, checkout_key="till-1-0002"))
+        replay, created = self.checkout(self.sale_data({self.water: 4}, checkout_key="till-1-0002"))
+
+        self.assertFalse(created)
+        self.assertEqual(replay.id, sale.id)
+        self.assertEqual(self.current_stock(self.water), 5)
+
+    def test_key_race_returns_the_committed_sale(self):
+        data = self.sale_data({self.soda: 1}, checkout_key="till-1-0003")
+        sale, _ = self.checkout(data)
+
+        real_filter = Sale.objects.filter
+        lookups = []
+
+        def racing_filter(*args, **kwargs):
+            # The other till had not committed yet when the key was looked up
+            lookups.append(kwargs)
+            if len(lookups) == 1:
+                return Sale.objects.none()
+            return real_filter(*args, **kwargs)
+
+        with mock.patch.object(Sale.objects, "filter", side_effect=racing_filter):
+            replay, created = self.checkout(data)
+
+        self.assertFalse(created)
+        self.assertEqual(replay.id, sale.id)
+        self.assertEqual(len(lookups), 2)
+        self.assertEqual(Sale.objects.count(), 1)
+        self.assertEqual(self.current_stock(self.soda), 4)
+
+    def test_sales_without_key_are_not_deduplicated(self):
+        self.checkout(self.sale_data({self.soda: 1}))
+        self.checkout(self.sale_data({self.soda: 1}))
+        self.assertEqual(Sale.objects.count(), 2)
+
+
+class SalesBatchTests(SalesTestCase):
+
+    def post_batch(self, entries):
+        return self.client.post("/sales/batch", json.dumps({"sales": entries}),
+                                content_type="application/json")
+
+    def test_every_entry_gets_a_status(self):
+        invalid = self.sale_data({self.soda: 1}, checkout_key="till-2-0004")
+        invalid["products"][0]["quantity"] = "many"
+        entries = [
+            self.sale_data({self.soda: 2}, checkout_key="till-2-0001"),
+            self.sale_data({self.soda: 1}),
+            self.sale_data({self.soda: 4}, checkout_key="till-2-0002"),
+            self.sale_data({self.water: 1}, checkout_key="till-2-0003", customer=999999),
+            invalid,
+        ]
+        results = self.post_batch(entries).json()["results"]
+
+        self.assertEqual([result["status"] for result in results],
+                         ["created", "invalid", "insufficient_stock", "invalid", "invalid"])
+        self.assertEqual(results[1]["error"], "checkout_key is required")
+        self.assertEqual(results[2]["lines"][0]["available"], 3)
+        self.assertEqual(results[3]["error"], "Customer not found")
+        self.assertEqual(Sale.objects.count(), 1)
+        self.assertEqual(self.current_stock(self.soda), 3)
+
+    def test_duplicate_keys(self):
+        sale, _ = self.checkout(self.sale_data({self.water: 1}, checkout_key="till-3-0001"))
+        entries = [
+            self.sale_data({self.water: 1}, checkout_key="till-3-0001"),
+            self.sale_data({self.soda: 1}, checkout_key="till-3-0002"),
+            self.sale_data({self.soda: 1}, checkout_key="till-3-0002"),
+        ]
+        results = self.post_batch(entries).json()["results"]
+
+        self.assertEqual(results[0], {"status": "duplicate", "sale_id": sale.id})
+        self.assertEqual(results[1]["status"], "created")
+        self.assertEqual(results[2], {"status": "duplicate", "sale_id": results[1]["sale_id"]})
+        self.assertEqual(self.current_stock(self.soda), 4)
+
+        # Sending the whole batch again creates nothing
+        again = self.post_batch(entries).json()["results"]
+        self.assertEqual({result["status"] for result in again}, {"duplicate"})
+        self.assertEqual(Sale.objects.count(), 2)
+
+    def test_stock_is_checked_in_order(self):
+        entries = [
+            self.sale_data({self.soda: 3}, checkout_key="till-4-0001"),
+            self.sale_data({self.soda: 3}, checkout_key="till-4-0002"),
+            self.sale_data({self.soda: 2}, checkout_key="till-4-0003"),
+        ]
+        results = self.post_batch(entries).json()["results"]
+        self.assertEqual([result["status"] for result in results],
+                         ["created", "insufficient_stock", "created"])
+        self.assertEqual(self.current_stock(self.soda), 0)
+
+    def test_ndjson_and_till_dates(self):
+        entries = [
+            self.sale_data({self.soda: 1}, checkout_key="till-5-0001",
+                           date_added="2026-01-02T10:30:00+03:00"),
+            self.sale_data({self.water: 1}, checkout_key="till-5-0002"),
+        ]
+        body = "\n".join(json.dumps(entry) for entry in entries) + "\n"
+        response = self.client.post("/sales/batch", body, content_type="application/x-ndjson")
+        results = response.json()["results"]
+
+        dated = Sale.objects.get(id=results[0]["sale_id"])
+        self.assertEqual(dated.date_added.isoformat(), "2026-01-02T07:30:00+00:00")
+        self.assertEqual(dated.item_count, 1)
+        self.assertEqual(results[1]["status"], "created")
+
+    def test_invalid_batches_are_rejected(self):
+        response = self.client.post("/sales/batch", json.dumps({"sales": "nope"}),
+                                    content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+        entries = [self.sale_data({self.soda: 1}, checkout_key="k" + str(index))
+                   for index in range(BATCH_MAX_SALES + 1)]
+        self.assertEqual(self.post_batch(entries).status_code, 400)
+        self.assertFalse(Sale.objects.exists())
+
+
+class SalesPageTests(SalesTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.bob = Customer.objects.create(first_name="Bob", last_name="Hill")
+        # The last name is optional
+        cls.cid = Customer.objects.create(first_name="Cid", last_name=None)
+        customers = [cls.customer, cls.bob, cls.cid]
+        # Days of the sales, two of them made at the same moment
+        days = [3, 1, 4, 1, 5, 9, 2]
+        for number, day in enumerate(days):
+            product = cls.soda if number % 2 else cls.water
+            sale = Sale.objects.create(
+                customer=customers[number % 3], sub_total=product.price,
+                grand_total=product.price * (number % 3 + 1), tax_amount=0, tax_percentage=0,
+                amount_payed=product.price, amount_change=0, item_count=number % 2 + 1)
+            Sale.objects.filter(id=sale.id).update(
+                date_added=datetime(2026, 3, day, 12, tzinfo=dt_timezone.utc))
+
+    def page(self, **params):
+        response = self.client.get("/sales/data", params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def ids(self, page):
+        return [row["id"] for row in page["data"]]
+
+    def test_cursor_pages_match_offset_pages(self):
+        for column in SALES_ORDER_COLUMNS:
+            for direction in ("asc", "desc"):
+                order = {"order[0][column]": column, "order[0][dir]": direction, "length": 3}
+                offset_pages = [self.page(start=start, **order) for start in (0, 3, 6)]
+
+                # Next pages from the last row of the previous one
+                pages = [offset_pages[0]]
+                for start in (3, 6):
+                    pages.append(self.page(
+                        start=start, after=pages[-1]["cursors"]["last"], **order))
+                self.assertEqual([self.ids(page) for page in pages],
+                                 [self.ids(page) for page in offset_pages], order)
+                self.assertEqual([row["number"] for row in pages[2]["data"]], [7])
+
+                # And back from the first row of the next one
+                previous = self.page(start=3, before=offset_pages[2]["cursors"]["first"], **order)
+                self.assertEqual(self.ids(previous), self.ids(offset_pages[1]), order)
+
+    def test_cursor_pages_past_a_customer_without_last_name(self):
+        for direction in ("asc", "desc"):
+            order = {"order[0][column]": 3, "order[0][dir]": direction, "length": 1}
+            expected = self.ids(self.page(length=10, **{
+                "order[0][column]": 3, "order[0][dir]": direction}))
+
+            pages = [self.page(**order)]
+            for start in range(1, 7):
+                pages.append(self.page(start=start, after=pages[-1]["cursors"]["last"], **order))
+            self.assertEqual([self.ids(page)[0] for page in pages], expected)
+
+            backwards = [pages[-1]]
+            for start in range(5, -1, -1):
+                backwards.append(self.page(
+                    start=start, before=backwards[-1]["cursors"]["first"], **order))
+            self.assertEqual([self.ids(page)[0] for page in reversed(backwards)], expected)
+        self.assertEqual(len(set(expected)), 7)
+
+    def test_default_order_is_latest_first(self):
+        ids = self.ids(self.page(length=10))
+        dates = list(Sale.objects.order_by("-date_added", "-id").values_list("id", flat=True))
+        self.assertEqual(ids, dates)
+
+    def test_filters(self):
+        page = self.page(min_date="2026-03-01", max_date="2026-03-03", length=10)
+        self.assertEqual(page["recordsTotal"], 7)
+        self.assertEqual(page["recordsFiltered"], 4)
+
+        page = self.page(**{"search[value]": "bob"})
+        self.assertEqual(page["recordsFiltered"], 2)
+        self.assertEqual({row["customer"] for row in page["data"]}, {"Bob Hill"})
+
+    def test_cursor_of_another_order_is_ignored(self):
+        by_total = self.page(**{"order[0][column]": 4, "length": 3})
+        page = self.page(start=3, after=by_total["cursors"]["last"], length=3)
+        self.assertEqual(self.ids(page), self.ids(self.page(start=3, length=3)))
+        page = self.page(start=3, after="not a cursor", length=3)
+        self.assertEqual(self.ids(page), self.ids(self.page(start=3, length=3)))
+
+    def test_invalid_parameters(self):
+        for params in ({"start": "abc"}, {"length": "x"}, {"order[0][column]": "x"},
+                       {"min_date": "2026-13-01"}, {"max_date": "yesterday"}):
+            response = self.client.get("/sales/data", params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn("error", response.json())
+
+
+@skipUnless(connection.vendor == "sqlite", "Reads SQLite query plans")
+class DateRangePlanTests(SalesTestCase):
+    """
+    The date range queries of the dashboard, the sales list and the exports
+    must search the date indexes instead of scanning the sales.
+    """
+    first_day = date(2026, 3, 1)
+    last_day = date(2026, 3, 7)
+
+    def assertSearchesByDate(self, sql, params=()):
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+            plan = "\n".join(str(row[-1]) for row in cursor.fetchall())
+        self.assertIsNone(FULL_SCAN.search(plan), sql + "\n" + plan)
+
+    def test_period_querysets(self):
+        start, end = local_period(self.first_day, self.last_day)
+        for queryset in (sales_in_period(start, end), details_in_period(start, end),
+                         filter_sales(Sale.objects.all(), "", self.first_day, self.last_day)):
+            self.assertSearchesByDate(*queryset.query.sql_with_params())
+
+    def test_reports(self):
+        self.checkout(self.sale_data({self.soda: 1}))
+        start, end = local_period(self.first_day, self.last_day)
+        with CaptureQueriesContext(connection) as queries:
+            sales_totals(start, end)
+            list(export_sales(start, end))
+            metrics_series(self.first_day, self.last_day, "hour")
+            metrics_series(self.first_day, self.last_day, "week")
+            top_sellers("week")
+            dashboard_context(parallel=False)
+            sales_page({"min_date": str(self.first_day), "max_date": str(self.last_day)})
+
+        # The parameters are already quoted in the captured SQL
+        checked = [query["sql"] for query in queries.captured_queries
+                   if DATE_FILTER.search(query["sql"])]
+        self.assertGreaterEqual(len(checked), 12)
+        for sql in checked:
+            self.assertSearchesByDate(sql)
+
+
+class DeletedSaleTests(SalesTestCase):
+
+    def summaries(self):
+        return list(DailySalesSummary.objects.order_by("date").values(
+            "date", *SUMMARY_FIELDS))
+
+    def test_deleted_sales_are_removed_from_the_summary(self):
+        kept, _ = self.checkout(self.sale_data({self.soda: 1}))
+        deleted, _ = self.checkout(self.sale_data({self.soda: 2, self.water: 1}, amount_payed=6))
+        other, _ = self.checkout(self.sale_data({self.water: 2}))
+        Sale.objects.filter(id=other.id).update(
+            date_added=datetime(2026, 3, 1, 9, tzinfo=dt_timezone.utc))
+        rebuild_daily_summary()
+
+        deleted.delete()
+        Sale.objects.filter(id=other.id).delete()
+
+        incremental = self.summaries()
+        self.assertEqual([(row["revenue"], row["units"], row["sale_count"])
+                          for row in incremental], [(2, 1, 1)])
+        rebuild_daily_summary()
+        self.assertEqual(self.summaries(), incremental)
+
+    def test_deleted_sales_are_removed_from_the_leaderboard(self):
+        self.checkout(self.sale_data({self.soda: 1}))
+        deleted, _ = self.checkout(self.sale_data({self.soda: 2, self.water: 1}))
+        deleted.delete()
+
+        buckets = list(DailyProductSales.objects.values_list("product_id", "units"))
+        self.assertEqual(buckets, [(self.soda.id, 1)])
+        self.assertEqual(top_sellers("today"),
+                         [{"id": self.soda.id, "name": "Soda", "quantity": 1}])
+        rebuild_leaderboard()
+        self.assertEqual(list(DailyProductSales.objects.values_list("product_id", "units")),
+                         buckets)
+
+
+class SaleCountTests(SalesTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.first, _ = self.checkout(self.sale_data({self.soda: 2, self.water: 1}))
+        self.second, _ = self.checkout(self.sale_data({self.water: 3}))
+        self.empty = Sale.objects.create(customer=self.customer)
+
+    def counts(self):
+        return list(Sale.objects.order_by("id").values_list("item_count", "line_count"))
+
+    def corrupt(self):
+        Sale.objects.filter(id=self.first.id).update(item_count=1)
+        Sale.objects.filter(id=self.second.id).update(line_count=2)
+        Sale.objects.filter(id=self.empty.id).update(item_count=4, line_count=1)
+
+    def test_check_and_fix(self):
+        self.assertEqual(self.counts(), [(3, 2), (3, 1), (0, 0)])
+        self.assertEqual(check_sale_counts(), [])
+
+        self.corrupt()
+        wrong = [self.first.id, self.second.id, self.empty.id]
+        self.assertEqual(sorted(check_sale_counts()), wrong)
+        self.assertEqual(self.counts(), [(1, 2), (3, 2), (4, 1)])
+
+        self.assertEqual(sorted(check_sale_counts(fix=True)), wrong)
+        self.assertEqual(self.counts(), [(3, 2), (3, 1), (0, 0)])
+        self.assertEqual(check_sale_counts(), [])
+
+    def test_command(self):
+        self.corrupt()
+        with self.assertRaisesMessage(CommandError, "Wrong counts on 3 sales"):
+            call_command("check_sale_counts", stdout=io.StringIO())
+
+        out = io.StringIO()
+        call_command("check_sale_counts", fix=True, stdout=out)
+        self.assertIn("Fixed the counts of 3 sales", out.getvalue())
+
+        out = io.StringIO()
+        call_command("check_sale_counts", stdout=out)
+        self.assertIn("The counts of every sale are right", out.getvalue())
+
+    def test_migration_backfill(self):
+        migration = importlib.import_module("sales.migrations.0012_sale_item_count_line_count")
+        # The fields were added with their default on every existing sale
+        Sale.objects.update(item_count=0, line_count=0)
+
+        migration.backfill_counts(apps, None)
+
+        self.assertEqual(self.counts(), [(3, 2), (3, 1), (0, 0)])
+
+
+class LeaderboardTests(SalesTestCase):
+
+    def add(self, date_added, *lines):
+        add_to_leaderboard([(Sale(date_added=date_added), [
+            {"product_id": product.id, "quantity": quantity} for product, quantity in lines])])
+
+    def buckets(self):
+        return list(DailyProductSales.objects.order_by("date", "product_id").values_list(
+            "date", "product_id", "units"))
+
+    def test_windows_end_at_local_midnight(self):
+        # Nairobi is 3 hours ahead of UTC, it is half past midnight on April 1st
+        now = datetime(2026, 3, 31, 21, 30, tzinfo=dt_timezone.utc)
+        self.add(datetime(2026, 3, 31, 21, 0, tzinfo=dt_timezone.utc), (self.soda, 1))
+        self.add(datetime(2026, 3, 31, 20, 59, tzinfo=dt_timezone.utc), (self.water, 2))
+        self.add(datetime(2026, 3, 25, 21, 0, tzinfo=dt_timezone.utc), (self.water, 3))
+        self.add(datetime(2026, 3, 25, 20, 59, tzinfo=dt_timezone.utc), (self.soda, 10))
+        self.add(datetime(2026, 3, 2, 20, 59, tzinfo=dt_timezone.utc), (self.water, 20))
+
+        with mock.patch("django.utils.timezone.now", return_value=now):
+            ranking = {window: [(row["name"], row["quantity"]) for row in top_sellers(window)]
+                       for window in LEADERBOARD_WINDOWS}
+        self.assertEqual(ranking, {
+            "today": [("Soda", 1)],
+            "week": [("Water", 5), ("Soda", 1)],
+            "month": [("Soda", 11), ("Water", 5)],
+            "all": [("Water", 25), ("Soda", 11)],
+        })
+        with self.assertRaises(ValueError):
+            top_sellers("year")
+
+    def test_bucket_created_by_another_checkout(self):
+        day = datetime(2026, 3, 1, 9, tzinfo=dt_timezone.utc)
+        bulk_update = DailyProductSales.objects.bulk_update
+
+        def other_checkout(*args, **kwargs):
+            # Another till creates the bucket right after the existing ones were read
+            bulk_update(*args, **kwargs)
+            DailyProductSales.objects.create(date=date(2026, 3, 1), product=self.soda, units=2)
+
+        with mock.patch.object(DailyProductSales.objects, "bulk_update",
+                               side_effect=other_checkout):
+            self.add(day, (self.soda, 3), (self.water, 1))
+
+        self.assertEqual(self.buckets(), [
+            (date(2026, 3, 1), self.soda.id, 5), (date(2026, 3, 1), self.water.id, 1)])
+
+    def test_rebuild_matches_the_checkouts(self):
+        self.checkout(self.sale_data({self.soda: 1, self.water: 2}))
+        checkout_batch([
+            self.sale_data({self.soda: 1}, checkout_key="till-6-0001",
+                           date_added="2026-03-01T23:59:00+03:00"),
+            self.sale_data({self.soda: 2, self.water: 1}, checkout_key="till-6-0002",
+                           date_added="2026-03-02T00:00:00+03:00"),
+            self.sale_data({self.water: 1}, checkout_key="till-6-0003",
+                           date_added="2026-03-01T22:00:00+00:00"),
+        ])
+        self.checkout(self.sale_data({self.soda: 1}))
+        incremental = self.buckets()
+        self.assertEqual(len(incremental), 5)
+
+        self.assertEqual(rebuild_leaderboard(), 5)
+        self.assertEqual(self.buckets(), incremental)
+
+
+class ReceiptExportTests(SalesTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.receipt_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.receipt_dir.cleanup)
+        receipt_settings = override_settings(RECEIPT_CACHE_DIR=self.receipt_dir.name)
+        receipt_settings.enable()
+        self.addCleanup(receipt_settings.disable)
+
+        # Noon in Nairobi on the 1st, 2nd and 5th of March
+        self.sales = []
+        for day in (1, 2, 5):
+            sale, _ = self.checkout(self.sale_data({self.soda: 1}))
+            Sale.objects.filter(id=sale.id).update(
+                date_added=datetime(2026, 3, day, 9, tzinfo=dt_timezone.utc))
+            self.sales.append(sale)
+        self.start, self.end = local_period(date(2026, 3, 1), date(2026, 3, 2))
+
+        patcher = mock.patch(
+            "sales.export.render_receipt",
+            side_effect=lambda sale, details: b"rendered " + str(sale.id).encode())
+        self.render = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def cache_receipt(self, sale):
+        path = receipts.receipt_path(sale.id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as receipt:
+            receipt.write(b"cached")
+
+    def read_zip(self, chunks):
+        with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as archive:
+            return {name: archive.read(name) for name in archive.namelist()}
+
+    def test_zip_copies_cached_receipts_and_renders_the_others(self):
+        first, second, _ = self.sales
+        self.cache_receipt(first)
+
+        chunks = list(stream_receipts_zip(export_sales(self.start, self.end)))
+
+        # A chunk is handed over after every receipt
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(self.read_zip(chunks), {
+            "receipt_" + str(first.id) + ".pdf": b"cached",
+            "receipt_" + str(second.id) + ".pdf": b"rendered " + str(second.id).encode(),
+        })
+        self.assertEqual(self.render.call_count, 1)
+
+    def test_merged_pdf(self):
+        documents = []
+
+        def document(context):
+            documents.append(mock.Mock(pages=["page of " + str(context["sale"].id)]))
+            return documents[-1]
+
+        render_context = mock.Mock()
+        render_context.document.side_effect = document
+        first, second, _ = self.sales
+        with mock.patch("sales.export.get_render_context", return_value=render_context):
+            pdf = render_receipts_pdf(export_sales(self.start, self.end))
+            self.assertIsNone(render_receipts_pdf(iter([])))
+
+        self.assertEqual(len(documents), 2)
+        documents[0].copy.assert_called_once_with(
+            ["page of " + str(first.id), "page of " + str(second.id)])
+        self.assertEqual(pdf, documents[0].copy.return_value.write_pdf.return_value)
+
+    def test_zip_view(self):
+        response = self.client.get("/sales/receipts/export",
+                                   {"start": "2026-03-02", "end": "2026-03-05"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/zip")
+        self.assertEqual(response["Content-Disposition"],
+                         'attachment; filename="receipts_2026-03-02_2026-03-05.zip"')
+        self.assertEqual(sorted(self.read_zip(response.streaming_content)), [
+            "receipt_" + str(sale.id) + ".pdf" for sale in self.sales[1:]])
+
+    def test_pdf_view(self):
+        exported = []
+
+        def render_pdf(sales):
+            exported.extend(sale.id for sale in sales)
+            return b"%PDF-merged"
+
+        with mock.patch("sales.views.render_receipts_pdf", side_effect=render_pdf):
+            response = self.client.get("/sales/receipts/export", {
+                "start": "2026-03-01", "end": "2026-03-02", "format": "pdf"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        self.assertEqual(response["Content-Disposition"],
+                         'attachment; filename="receipts_2026-03-01_2026-03-02.pdf"')
+        self.assertEqual(response.content, b"%PDF-merged")
+        self.assertEqual(exported, [sale.id for sale in self.sales[:2]])
+
+    def test_pdf_view_of_an_empty_or_too_large_range(self):
+        with mock.patch("sales.views.render_receipts_pdf") as render_pdf:
+            response = self.client.get("/sales/receipts/export", {
+                "start": "2026-03-03", "end": "2026-03-04", "format": "pdf"})
+            self.assertRedirects(response, "/sales/", fetch_redirect_response=False)
+
+            with mock.patch("sales.views.EXPORT_PDF_MAX_SALES", 1):
+                response = self.client.get("/sales/receipts/export", {
+                    "start": "2026-03-01", "end": "2026-03-02", "format": "pdf"})
+            self.assertRedirects(response, "/sales/", fetch_redirect_response=False)
+        render_pdf.assert_not_called()
+
+    def test_invalid_dates(self):
+        for params in ({}, {"start": "2026-03-01"}, {"start": "2026-03-01", "end": "2026-13-01"},
+                       {"start": "abc", "end": "2026-03-01"},
+                       {"start": "2026-03-02", "end": "2026-03-01"}):
+            response = self.client.get("/sales/receipts/export", params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertEqual(response.json(), {"error": "Invalid date range"})
+
+
+class ThermalReceiptTests(SalesTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.latte = Product.objects.create(
+            name="Café latte with oat milk and caramel syrup, large cup ☕",
+            description="Latte", status="ACTIVE", category=cls.category,
+            price=3.5, buying_price=1, stock=5)
+
+    def setUp(self):
+        super().setUp()
+        self.sale, _ = self.checkout(self.sale_data({self.soda: 2, self.latte: 1}))
+        self.details = self.sale.saledetail_set.select_related("product").order_by("id")
+
+    def test_text_layout(self):
+        lines = render_text(self.sale, self.details).splitlines()
+
+        self.assertTrue(all(len(line) <= RECEIPT_WIDTH for line in lines))
+        self.assertEqual(lines[0], "VISION ELECTRONICS".center(RECEIPT_WIDTH).rstrip())
+        self.assertIn("Customer: Ann Lee", lines)
+        self.assertIn("Soda                     2       2.00       4.00", lines)
+        # Long names are wrapped and their numbers go below them
+        start = lines.index("Café latte with oat milk and caramel syrup,")
+        self.assertEqual(lines[start + 1:start + 3], [
+            "large cup ☕",
+            "                         1       3.50       3.50",
+        ])
+        self.assertIn("Grand Total                                 7.50", lines)
+        self.assertIn("Change                                      0.00", lines)
+        self.assertEqual(lines[-1],
+                         "THANK YOU FOR YOUR PREFERENCE!".center(RECEIPT_WIDTH).rstrip())
+
+    def test_escpos_framing(self):
+        data = render_escpos(self.sale, self.details)
+
+        self.assertTrue(data.startswith(ESC_INIT))
+        self.assertTrue(data.endswith(ESC_FEED_AND_CUT))
+        # Encoded for the printer, characters it does not have are replaced
+        self.assertIn("Café latte".encode("cp437"), data)
+        self.assertIn(b"large cup ?\n", data)
+        self.assertNotIn("é".encode("utf-8"), data)
+        self.assertIn(b"Soda                     2       2.00       4.00\n", data)
+
+    def test_view_formats(self):
+        url = "/sales/text/" + str(self.sale.id)
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/plain; charset=utf-8")
+        self.assertEqual(response.content.decode("utf-8"), render_text(self.sale, self.details))
+
+        response = self.client.get(url, {"format": "escpos"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/octet-stream")
+        self.assertEqual(response.content, render_escpos(self.sale, self.details))
+
+    def test_unknown_sale_is_not_found(self):
+        self.assertEqual(self.client.get("/sales/text/999999").status_code, 404)
+        self.assertEqual(self.client.get("/sales/text/abc").status_code, 404)
+
+
+class ReceiptCacheTests(POSTransactionTestCase):
+    """
+    Receipts are rendered by worker threads after the sale is committed, so
+    these tests do not run inside a transaction.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.receipt_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.receipt_dir.cleanup)
+        receipt_settings = override_settings(RECEIPT_CACHE_DIR=self.receipt_dir.name)
+        receipt_settings.enable()
+        self.addCleanup(receipt_settings.disable)
+
+        self.user = User.objects.create_user("cashier", password="secret")
+        self.client.force_login(self.user)
+        customer = Customer.objects.create(first_name="Ann", last_name="Lee")
+        category = Category.objects.create(name="Drinks", description="Drinks", status="ACTIVE")
+        soda = Product.objects.create(
+            name="Soda", description="Soda", status="ACTIVE", category=category,
+            price=2, buying_price=1, stock=5)
+        data = {"customer": customer.id, "sub_total": 2, "grand_total": 2, "tax_amount": 0,
+                "tax_percentage": 0, "amount_payed": 2, "amount_change": 0,
+                "products": [{"id": soda.id, "price": 2, "quantity": 1, "total_product": 2}]}
+
+        patcher = mock.patch("sales.receipts.render_receipt", wraps=receipts.render_receipt)
+        self.render = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.sale, _ = checkout(parse_sale(data), data["products"])
+
+    def test_receipt_is_rendered_once_after_the_sale(self):
+        path = receipts.get_receipt(self.sale.id)
+
+        self.assertEqual(path, receipts.receipt_path(self.sale.id))
+        self.assertTrue(os.path.exists(path))
+        # Already on disk, nothing is queued again
+        self.assertIsNone(receipts.schedule_receipt(self.sale.id))
+        self.assertEqual(receipts.get_receipt(self.sale.id), path)
+        self.assertEqual(self.render.call_count, 1)
+        self.assertEqual(os.listdir(os.path.dirname(path)), [str(self.sale.id) + ".pdf"])
+
+    def test_receipt_view_serves_the_cached_pdf(self):
+        response = self.client.get("/sales/pdf/" + str(self.sale.id))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        with open(receipts.receipt_path(self.sale.id), "rb") as receipt:
+            self.assertEqual(b"".join(response.streaming_content), receipt.read())
+        self.assertEqual(self.render.call_count, 1)
+
+    def test_unknown_sale_is_not_found(self):
+        self.assertEqual(self.client.get("/sales/pdf/999999").status_code, 404)
+        self.assertEqual(self.client.get("/sales/pdf/abc").status_code, 404)
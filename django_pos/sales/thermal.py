@@ -0,0 +1,122 @@
+import textwrap
+
+from django.utils import timezone
+
+# Characters per line of an 80mm printer with the default font
+RECEIPT_WIDTH = 48
+
+COMPANY_NAME = "Vision Electronics"
+COMPANY_LINES = (
+    "135 East 57th Street",
+    "Nairobi, NRB 10011, Kenya",
+    "Phone: (254) 484-6829",
+)
+
+# ESC/POS commands
+ESC_INIT = b"\x1b@"
+ESC_ALIGN_LEFT = b"\x1ba\x00"
+ESC_ALIGN_CENTER = b"\x1ba\x01"
+ESC_BOLD_ON = b"\x1bE\x01"
+ESC_BOLD_OFF = b"\x1bE\x00"
+ESC_DOUBLE_ON = b"\x1d!\x11"
+ESC_DOUBLE_OFF = b"\x1d!\x00"
+ESC_FEED_AND_CUT = b"\x1dVB\x03"
+# Code page 437 is selected by ESC_INIT on every ESC/POS printer
+ESC_ENCODING = "cp437"
+
+
+def _money(value):
+    return "{:.2f}".format(value)
+
+
+def _pair(label, value, width):
+    # Label on the left and value on the right of the same line
+    return label + value.rjust(width - len(label))
+
+
+def _product_lines(detail, width):
+    numbers = "{:>4} {:>10} {:>10}".format(
+        detail.quantity, _money(detail.price), _money(detail.total_detail))
+    name = detail.product.name
+    room = width - len(numbers) - 1
+    if len(name) <= room:
+        return [name.ljust(room) + " " + numbers]
+    # Long names get their own lines and the numbers go below them
+    lines = textwrap.wrap(name, width)
+    lines.append(numbers.rjust(width))
+    return lines
+
+
+def receipt_sections(sale, details, width=RECEIPT_WIDTH):
+    """
+    Lays out a receipt as fixed-width text.
+
+    Args:
+        sale: The sale, with its customer loaded
+        details: The sale details, with their products loaded
+        width: Characters per line
+
+    Returns (header, body) lists of lines. The header is printed centered.
+    """
+    rule = "-" * width
+    header = [COMPANY_NAME.upper()] + list(COMPANY_LINES)
+
+    body = [
+        rule,
+        "Date: " + timezone.localtime(sale.date_added).strftime("%Y-%m-%d %H:%M"),
+        "Sale ID: " + str(sale.id),
+        "Customer: " + sale.customer.get_full_name(),
+        rule,
+        _pair("Product", "{:>4} {:>10} {:>10}".format("Qty", "Price", "Total"), width),
+        rule,
+    ]
+    for detail in details:
+        body.extend(_product_lines(detail, width))
+    body.extend([
+        rule,
+        _pair("Subtotal", _money(sale.sub_total), width),
+        _pair("Tax Inclusive (" + str(sale.tax_percentage) + "%)",
+              _money(sale.tax_amount), width),
+        _pair("Grand Total", _money(sale.grand_total), width),
+        _pair("Amount payed", _money(sale.amount_payed), width),
+        _pair("Change", _money(sale.amount_change), width),
+        rule,
+    ])
+    return header, body
+
+
+def render_text(sale, details, width=RECEIPT_WIDTH):
+    """
+    Returns the receipt as plain text, one line per printer line.
+    """
+    header, body = receipt_sections(sale, details, width)
+    lines = [line.center(width).rstrip() for line in header]
+    lines.extend(body)
+    lines.append("THANK YOU FOR YOUR PREFERENCE!".center(width).rstrip())
+    return "\n".join(lines) + "\n"
+
+
+def render_escpos(sale, details, width=RECEIPT_WIDTH):
+    """
+    Returns the receipt as an ESC/POS byte stream ready to be sent to a
+    thermal printer, ending with a paper cut.
+    """
+    header, body = receipt_sections(sale, details, width)
+
+    def encode(lines):
+        return ("\n".join(lines) + "\n").encode(ESC_ENCODING, errors="replace")
+
+    return b"".join((
+        ESC_INIT,
+        ESC_ALIGN_CENTER,
+        ESC_BOLD_ON, ESC_DOUBLE_ON,
+        encode(header[:1]),
+        ESC_DOUBLE_OFF, ESC_BOLD_OFF,
+        encode(header[1:]),
+        ESC_ALIGN_LEFT,
+        encode(body),
+        ESC_ALIGN_CENTER, ESC_BOLD_ON,
+        encode(["THANK YOU FOR YOUR PREFERENCE!"]),
+        ESC_BOLD_OFF,
+        ESC_FEED_AND_CUT,
+    ))
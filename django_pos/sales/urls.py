@@ -6,12 +6,22 @@ app_name = "sales"
 urlpatterns = [
     # List sales
     path('', views.sales_list_view, name='sales_list'),
+    # Pages of the sales list for DataTables
+    path('data', views.sales_data_view, name='sales_data'),
     # Add sale
     path('add', views.sales_add_view, name='sales_add'),
+    # Add sales queued by offline tills
+    path('batch', views.sales_batch_view, name='sales_batch'),
     # Details sale
     path('details/<str:sale_id>',
          views.sales_details_view, name='sales_details'),
     # Sale receipt PDF
     path("pdf/<str:sale_id>",
          views.receipt_pdf_view, name="sales_receipt_pdf"),
+    # Receipts of a date range in one download
+    path("receipts/export",
+         views.receipts_export_view, name="sales_receipts_export"),
+    # Sale receipt for thermal printers
+    path("text/<str:sale_id>",
+         views.receipt_text_view, name="sales_receipt_text"),
 ]
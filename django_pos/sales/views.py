@@ -1,17 +1,22 @@
-import os
-
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect
+from django.utils.dateparse import parse_date
+from django.views.decorators.http import require_GET, require_POST
 from django_pos.wsgi import *
-from django_pos import settings
-from django.template.loader import get_template
 from customers.models import Customer
-from products.models import Product
-from weasyprint import HTML, CSS
+from .export import EXPORT_PDF_MAX_SALES, export_sales, render_receipts_pdf, stream_receipts_zip
+from .listing import sales_page
 from .models import Sale, SaleDetail
+from .receipts import get_receipt
+from .services import InsufficientStock, checkout, checkout_batch
+from .summary import local_period, sales_in_period
+from .thermal import render_escpos, render_text
 import json
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 def is_ajax(request):
@@ -22,75 +27,109 @@ def is_ajax(request):
 def sales_list_view(request):
     context = {
         "active_icon": "sales",
-        "sales": Sale.objects.all().order_by("-date_added")
     }
     return render(request, "sales/sales.html", context=context)
 
 
+@login_required(login_url="/accounts/login/")
+@require_GET
+def sales_data_view(request):
+    """
+    Args:
+        request: GET sent by DataTables server-side processing
+    Returns one page of the sales table as JSON.
+    """
+    try:
+        return JsonResponse(sales_page(request.GET))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+
 @login_required(login_url="/accounts/login/")
 def sales_add_view(request):
     context = {
         "active_icon": "sales",
-        "customers": [c.to_select2() for c in Customer.objects.all()]
     }
 
     if request.method == 'POST':
         if is_ajax(request=request):
-            # Save the POST arguments
-            data = json.load(request)
-
-            sale_attributes = {
-                "customer": Customer.objects.get(id=int(data['customer'])),
-                "sub_total": float(data["sub_total"]),
-                "grand_total": float(data["grand_total"]),
-                "tax_amount": float(data["tax_amount"]),
-                "tax_percentage": float(data["tax_percentage"]),
-                "amount_payed": float(data["amount_payed"]),
-                "amount_change": float(data["amount_change"]),
-            }
             try:
-                # Create the sale
-                new_sale = Sale.objects.create(**sale_attributes)
-
-                # Update the stock of each product sold
-                products = data["products"]
-                for product_data in products:
-                    product_id = int(product_data["id"])
-                    quantity_sold = int(product_data["quantity"])
-                    product = Product.objects.get(id=product_id)
-                    if product.stock >= quantity_sold:
-                        # Update product stock
-                        product.stock -= quantity_sold
-                        product.save()
-                        # Create the sale detail
-                        detail_attributes = {
-                            "sale": new_sale,
-                            "product": product,
-                            "price": float(product_data["price"]),
-                            "quantity": quantity_sold,
-                            "total_detail": float(product_data["total_product"])
-                        }
-                        SaleDetail.objects.create(**detail_attributes)
-                    else:
-                        # Handle insufficient stock situation
-                        messages.error(
-                            request, f'Insufficient stock for product: {product.name}')
-                        # Rollback the sale
-                        new_sale.delete()
-                        return redirect('sales:sales_add')
-
-                messages.success(
-                    request, 'Sale created successfully!', extra_tags="success")
+                # Save the POST arguments
+                data = json.load(request)
+
+                sale_attributes = {
+                    "customer": Customer.objects.get(id=int(data['customer'])),
+                    "sub_total": float(data["sub_total"]),
+                    "grand_total": float(data["grand_total"]),
+                    "tax_amount": float(data["tax_amount"]),
+                    "tax_percentage": float(data["tax_percentage"]),
+                    "amount_payed": float(data["amount_payed"]),
+                    "amount_change": float(data["amount_change"]),
+                }
+
+                # Create the sale, its details and update the stock at once
+                new_sale, created = checkout(
+                    sale_attributes, data["products"], data.get("checkout_key"))
+
+                if created:
+                    messages.success(
+                        request, 'Sale created successfully!', extra_tags="success")
+                return JsonResponse({"sale_id": new_sale.id, "created": created})
+
+            except InsufficientStock as e:
+                # Report every product without enough stock in one message
+                messages.error(
+                    request, 'Insufficient stock for: ' + ", ".join(line["name"] for line in e.lines), extra_tags="danger")
+                return JsonResponse({"insufficient_stock": e.lines}, status=409)
 
             except Exception as e:
                 messages.error(
                     request, 'There was an error during the creation!', extra_tags="danger")
+                logger.exception("Sale could not be created")
+                return JsonResponse({"error": str(e)}, status=400)
 
         return redirect('sales:sales_list')
 
     return render(request, "sales/sales_add.html", context=context)
 
 
+def read_batch(request):
+    """
+    Reads the sales queued by an offline till, either as a JSON list, as
+    {"sales": [...]} or as newline-delimited JSON with one sale per line.
+    """
+    if request.content_type in ("application/x-ndjson", "application/jsonl"):
+        # Parse line by line, without loading the whole body as one document
+        return [json.loads(line) for line in request if line.strip()]
+
+    data = json.load(request)
+    if isinstance(data, dict):
+        data = data["sales"]
+    if not isinstance(data, list):
+        raise ValueError("Expected a list of sales")
+    return data
+
+
+@login_required(login_url="/accounts/login/")
+@require_POST
+def sales_batch_view(request):
+    """
+    Receives the sales queued by a till while it was offline.
+    Returns the status of each sale in the same order they were sent.
+    """
+    try:
+        entries = read_batch(request)
+    except (KeyError, ValueError) as e:
+        return JsonResponse({"error": "Invalid batch: " + str(e)}, status=400)
+
+    try:
+        results = checkout_batch(entries)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    return JsonResponse({"results": results})
+
+
 @login_required(login_url="/accounts/login/")
 def sales_details_view(request, sale_id):
     """
@@ -125,24 +164,75 @@ def receipt_pdf_view(request, sale_id):
         request:
         sale_id: ID of the sale to view the receipt
     """
-    # Get the sale
-    sale = Sale.objects.get(id=sale_id)
+    try:
+        # Rendered in the background when the sale was created
+        path = get_receipt(int(sale_id))
+    except (ValueError, Sale.DoesNotExist):
+        raise Http404("Sale not found")
 
-    # Get the sale details
-    details = SaleDetail.objects.filter(sale=sale)
+    return FileResponse(open(path, "rb"), content_type="application/pdf")
 
-    template = get_template("sales/sales_receipt_pdf.html")
-    context = {
-        "sale": sale,
-        "details": details
-    }
-    html_template = template.render(context)
 
-    # CSS Boostrap
-    css_url = os.path.join(
-        settings.BASE_DIR, 'static/css/receipt_pdf/bootstrap.min.css')
+@login_required(login_url="/accounts/login/")
+def receipts_export_view(request):
+    """
+    Args:
+        request: GET with the start and end dates (both included) and the
+            format: "zip" (one PDF per sale, streamed) or "pdf" (one document)
+
+    Returns a JSON error with status 400 when the dates are missing or invalid.
+    """
+    try:
+        first_day = parse_date(request.GET.get("start") or "")
+        last_day = parse_date(request.GET.get("end") or "")
+    except ValueError:
+        first_day = last_day = None
+    if first_day is None or last_day is None or last_day < first_day:
+        return JsonResponse({"error": "Invalid date range"}, status=400)
+
+    start, end = local_period(first_day, last_day)
+    filename = "receipts_" + str(first_day) + "_" + str(last_day)
+
+    if request.GET.get("format") == "pdf":
+        count = sales_in_period(start, end).count()
+        if count == 0:
+            messages.error(request, 'There are no sales in that range!',
+                           extra_tags="warning")
+            return redirect('sales:sales_list')
+        if count > EXPORT_PDF_MAX_SALES:
+            messages.error(request, 'Too many sales for one PDF, download them as ZIP!',
+                           extra_tags="warning")
+            return redirect('sales:sales_list')
+
+        response = HttpResponse(render_receipts_pdf(
+            export_sales(start, end)), content_type="application/pdf")
+        response["Content-Disposition"] = 'attachment; filename="' + filename + '.pdf"'
+        return response
+
+    response = StreamingHttpResponse(stream_receipts_zip(
+        export_sales(start, end)), content_type="application/zip")
+    response["Content-Disposition"] = 'attachment; filename="' + filename + '.zip"'
+    return response
+
+
+@login_required(login_url="/accounts/login/")
+def receipt_text_view(request, sale_id):
+    """
+    Args:
+        request:
+        sale_id: ID of the sale to print the receipt
+    Returns the receipt as plain text, or as ESC/POS bytes for thermal
+    printers with ?format=escpos.
+    """
+    try:
+        sale = Sale.objects.select_related("customer").get(id=int(sale_id))
+    except (ValueError, Sale.DoesNotExist):
+        raise Http404("Sale not found")
 
-    # Create the pdf
-    pdf = HTML(string=html_template).write_pdf(stylesheets=[CSS(css_url)])
+    details = SaleDetail.objects.filter(sale=sale).select_related("product")
 
-    return HttpResponse(pdf, content_type="application/pdf")
+    if request.GET.get("format") == "escpos":
+        return HttpResponse(render_escpos(sale, details),
+                            content_type="application/octet-stream")
+    return HttpResponse(render_text(sale, details),
+                        content_type="text/plain; charset=utf-8")
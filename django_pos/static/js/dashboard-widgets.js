@@ -0,0 +1,47 @@
+// Loads the dashboard widgets that were still being computed when the page
+// was rendered. Their names are in the pending_widgets JSON script, the
+// widget URL and the chart scripts in the data attributes of this script.
+var widgetScript = document.currentScript;
+var pendingWidgets = JSON.parse(document.getElementById("pending_widgets").textContent);
+var widgetCharts = {
+    "earnings": widgetScript.dataset.earningsChart,
+    "top_products": widgetScript.dataset.topProductsChart
+};
+
+function formatWidgetValue(field, value) {
+    if (field === "daily_profit") {
+        return Number(value).toFixed(2);
+    }
+    return value;
+}
+
+function showWidget(name, data) {
+    document.querySelectorAll('[data-widget="' + name + '"]').forEach(function (element) {
+        var value = data[element.dataset.field];
+        if (element.dataset.index !== undefined) {
+            value = value[Number(element.dataset.index)];
+        }
+        if (value === undefined) {
+            value = "";
+        }
+        if (element.tagName === "INPUT") {
+            element.value = value;
+        } else {
+            element.textContent = formatWidgetValue(element.dataset.field, value);
+        }
+    });
+
+    // Charts read their data from the inputs, so they are drawn afterwards
+    if (widgetCharts[name]) {
+        var script = document.createElement("script");
+        script.src = widgetCharts[name];
+        document.body.appendChild(script);
+    }
+}
+
+pendingWidgets.forEach(function (name) {
+    var url = widgetScript.dataset.widgetUrl.replace("WIDGET", encodeURIComponent(name));
+    fetch(url, { credentials: "same-origin" })
+        .then(function (response) { return response.json(); })
+        .then(function (data) { showWidget(name, data); });
+});